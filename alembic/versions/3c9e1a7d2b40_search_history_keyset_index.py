@@ -0,0 +1,35 @@
+"""search_history keyset index
+
+Revision ID: 3c9e1a7d2b40
+Revises: fb3bf5b4762d
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = '3c9e1a7d2b40'
+down_revision: Union[str, None] = 'fb3bf5b4762d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Serves history pages newest first per project; built concurrently so writes keep going.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_search_history_project_created_id",
+            "search_history",
+            ["project_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_search_history_project_created_id",
+            table_name="search_history",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,39 @@
+"""serp_result_items
+
+Revision ID: 5a7c3e9f1d82
+Revises: 8d2f6b1c4e57
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '5a7c3e9f1d82'
+down_revision: Union[str, None] = '8d2f6b1c4e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing history is filled in by managers.project_tasks.backfill_result_items_task.
+    op.create_table(
+        "serp_result_items",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("history_id", sa.Integer(), sa.ForeignKey("search_history.id", ondelete="CASCADE"),
+                  nullable=False),
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("url", sa.Text(), nullable=False),
+        sa.Column("domain", sa.String(255), nullable=False),
+        sa.Column("title", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_serp_result_items_project_domain", "serp_result_items", ["project_id", "domain"])
+    op.create_index("ix_serp_result_items_history_id", "serp_result_items", ["history_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_serp_result_items_history_id", table_name="serp_result_items")
+    op.drop_index("ix_serp_result_items_project_domain", table_name="serp_result_items")
+    op.drop_table("serp_result_items")
@@ -0,0 +1,82 @@
+"""search_history compressed / jsonb payload columns
+
+Revision ID: 8d2f6b1c4e57
+Revises: 3c9e1a7d2b40
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from db.results_codec import RESULTS_CODEC, encode_results, decode_results_text
+
+revision: str = '8d2f6b1c4e57'
+down_revision: Union[str, None] = '3c9e1a7d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK = int(os.getenv("RESULTS_BACKFILL_CHUNK", "500"))
+
+_UPDATE = sa.text(
+    "UPDATE search_history SET results_blob = :results_blob, "
+    "results_jsonb = CAST(:results_jsonb AS JSONB), results_json = :results_json WHERE id = :id"
+)
+
+
+def _rewrite(select_sql: str, convert):
+    # Walks the table by id in chunks outside the migration transaction, so the backfill never
+    # holds long locks or builds one huge transaction. Converted rows drop out of the WHERE clause,
+    # so an interrupted run simply continues on the next upgrade.
+    conn = op.get_bind()
+    last_id = 0
+    with op.get_context().autocommit_block():
+        conn.execute(sa.text("SET synchronous_commit TO OFF"))
+        while True:
+            rows = conn.execute(sa.text(select_sql), {"last_id": last_id, "limit": BACKFILL_CHUNK}).fetchall()
+            if not rows:
+                break
+            conn.execute(_UPDATE, [{"id": row[0], **convert(row)} for row in rows])
+            last_id = rows[-1][0]
+        conn.execute(sa.text("RESET synchronous_commit"))
+
+
+def _encode(row) -> dict:
+    values = encode_results(row[1])
+    if values["results_jsonb"] is not None:
+        # The stored text already is the JSON the CAST needs.
+        values["results_jsonb"] = row[1]
+    return values
+
+
+def _decode(row) -> dict:
+    return {"results_blob": None, "results_jsonb": None, "results_json": decode_results_text(row[1], row[2], None)}
+
+
+def upgrade() -> None:
+    # The columns are committed before the backfill starts, so they may exist from an interrupted run.
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("search_history")}
+    if "results_blob" not in existing:
+        op.add_column("search_history", sa.Column("results_blob", sa.LargeBinary(), nullable=True))
+    if "results_jsonb" not in existing:
+        op.add_column("search_history", sa.Column("results_jsonb", postgresql.JSONB(), nullable=True))
+    if RESULTS_CODEC == "text":
+        return
+    _rewrite(
+        "SELECT id, results_json FROM search_history "
+        "WHERE results_json IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit",
+        _encode,
+    )
+
+
+def downgrade() -> None:
+    _rewrite(
+        "SELECT id, results_blob, results_jsonb FROM search_history "
+        "WHERE (results_blob IS NOT NULL OR results_jsonb IS NOT NULL) AND id > :last_id ORDER BY id LIMIT :limit",
+        _decode,
+    )
+    op.drop_column("search_history", "results_jsonb")
+    op.drop_column("search_history", "results_blob")
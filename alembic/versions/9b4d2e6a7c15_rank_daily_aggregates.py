@@ -0,0 +1,44 @@
+"""rank_daily and query_daily aggregates
+
+Revision ID: 9b4d2e6a7c15
+Revises: 5a7c3e9f1d82
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '9b4d2e6a7c15'
+down_revision: Union[str, None] = '5a7c3e9f1d82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled from existing history by managers.project_tasks.rebuild_rank_aggregates_task.
+    op.create_table(
+        "rank_daily",
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("domain", sa.String(255), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("query_text", sa.String(500), nullable=False),
+        sa.Column("best_position", sa.Integer(), nullable=False),
+        sa.Column("position_sum", sa.Integer(), nullable=False),
+        sa.Column("samples", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("project_id", "domain", "day", "query_text"),
+    )
+    op.create_table(
+        "query_daily",
+        sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id"), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("query_text", sa.String(500), nullable=False),
+        sa.Column("runs", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("project_id", "day", "query_text"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("query_daily")
+    op.drop_table("rank_daily")
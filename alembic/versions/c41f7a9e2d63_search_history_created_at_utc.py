@@ -0,0 +1,26 @@
+"""search_history.created_at defaults to UTC
+
+Revision ID: c41f7a9e2d63
+Revises: 9b4d2e6a7c15
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = 'c41f7a9e2d63'
+down_revision: Union[str, None] = '9b4d2e6a7c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NOW() followed the session time zone. Existing rows keep their values; on the default UTC
+    # server they already match, otherwise rebuild the rank aggregates after converting them.
+    op.alter_column("search_history", "created_at", server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    op.alter_column("search_history", "created_at", server_default=sa.text("NOW()"))
@@ -0,0 +1,57 @@
+from typing import Optional
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+
+from services.serp_compaction import compaction_counters
+from services.analysis_cache import analysis_stats
+from services.telegram_sender import send_stats
+from auth.keycloak_auth import auth_counters, claims_cache
+from services.serper_service import serper_client, serp_cache, invalidate_search, shared_counters
+
+router = APIRouter()
+
+
+@router.get("/serper", summary="Serper latency, breaker, hedging, SERP cache and coalescing stats")
+async def serper_metrics():
+    # Counters are totals across all processes, a few seconds behind; "process" holds what only
+    # the process serving this request can know (latency window, breaker state, L1 size).
+    totals = {name: await counters.aread() for name, counters in shared_counters.items()}
+    cache = totals["cache"]
+    hits = cache["l1_hits"] + cache["l2_hits"]
+    lookups = hits + cache["misses"]
+    return {
+        "client": totals["client"],
+        "breaker": totals["breaker"],
+        "rate_limiter": totals["rate_limiter"],
+        "cache": {**cache, "hit_ratio": round(hits / lookups, 3) if lookups else None},
+        "fallback": totals["fallback"],
+        "singleflight": {
+            "thread": totals["singleflight_thread"],
+            "async": totals["singleflight_async"],
+            "redis": totals["singleflight_redis"],
+        },
+        "process": {**serper_client.stats(), "cache_l1_size": len(serp_cache.l1)},
+    }
+
+
+@router.delete("/serper/cache", summary="Invalidate one cached SERP, or the whole cache when no query is given")
+async def invalidate_serp_cache(query: Optional[str] = None, country: str = "US", language: str = "en",
+                                domain: str = "google.com"):
+    await run_in_threadpool(invalidate_search, query, country, language, domain)
+    return {"invalidated": query or "all"}
+
+
+@router.get("/ai", summary="AI analysis token savings")
+async def ai_metrics():
+    return {"compaction": await compaction_counters.aread(), "analysis_cache": await analysis_stats()}
+
+
+@router.get("/telegram", summary="Outbound Telegram send scheduler stats")
+async def telegram_metrics():
+    return await send_stats()
+
+
+@router.get("/auth", summary="Token verification and claims cache stats")
+async def auth_metrics():
+    return {**auth_counters, "cached_tokens": len(claims_cache)}
@@ -1,18 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, validator
 from typing import Optional
-import json
 from typing import List
-from datetime import datetime
-from sqlalchemy.orm import Session
-from db.database import get_db
-from db.models.project import Project
-from db.models.project_member import ProjectMember
-from db.models.telegram_user import TelegramUser
-from db.models.search_history import SearchHistory
-from services.serper_service import google_search
-
-from sqlalchemy_celery_beat.models import PeriodicTask, IntervalSchedule, ClockedSchedule, PeriodicTaskChanged
+from datetime import datetime, date
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.async_database import get_async_db
+from services import project_service
+from services.project_service import ServiceError
+from services.history_export import stream_history, EXPORT_MEDIA_TYPES
+from services.deep_search import SERP_PAGE_SIZE, SERP_MAX_DEPTH
 
 router = APIRouter()
 
@@ -30,7 +29,39 @@ class SearchRequest(BaseModel):
     country: str = "US"
     language: str = "en"
     domain: str = "google.com"
+    depth: int = SERP_PAGE_SIZE
+    user_id: int
+
+    @validator("depth")
+    def check_depth(cls, v):
+        if v < 1 or v > SERP_MAX_DEPTH:
+            raise ValueError(f"depth must be between 1 and {SERP_MAX_DEPTH}")
+        return v
+
+
+class BatchQueryItem(BaseModel):
+    query: str
+    country: str = "US"
+    language: str = "en"
+    domain: str = "google.com"
+
+
+class BatchSearchRequest(BaseModel):
     user_id: int
+    queries: List[BatchQueryItem]
+    include_results: bool = False
+
+    @validator("queries")
+    def check_queries(cls, v):
+        if not v:
+            raise ValueError("queries must not be empty")
+        return v
+
+
+class SummaryRequest(BaseModel):
+    user_id: int
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
 
 
 # api/routes/project_routes.py
@@ -44,6 +75,7 @@ class ScheduleData(BaseModel):
     country: str = "US"
     language: str = "en"
     domain: str = "google.com"
+    depth: int = SERP_PAGE_SIZE
 
     @validator("schedule_type")
     def check_schedule_type(cls, v):
@@ -69,151 +101,143 @@ class ScheduleData(BaseModel):
                 raise ValueError("interval_seconds must be a positive integer for interval schedule")
         return v
 
+    @validator("depth")
+    def check_depth(cls, v):
+        if v < 1 or v > SERP_MAX_DEPTH:
+            raise ValueError(f"depth must be between 1 and {SERP_MAX_DEPTH}")
+        return v
 
-@router.post("/projects/create")
-def create_project(schema: ProjectCreateSchema, user_id: int, db: Session = Depends(get_db)):
-    user = db.query(TelegramUser).filter_by(id=user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    project = Project(name=schema.name, creator_id=user.id)
-    db.add(project)
-    db.commit()
-    db.refresh(project)
 
-    pm = ProjectMember(project_id=project.id, user_id=user.id, role="admin")
-    db.add(pm)
-    db.commit()
-    return {"project_id": project.id, "name": project.name}
+@router.post("/projects/create")
+async def create_project(schema: ProjectCreateSchema, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.create_project(db, schema.name, user_id)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
 @router.post("/projects/{project_id}/add_members")
-def add_members(project_id: int, schema: ProjectAddMembersSchema, db: Session = Depends(get_db)):
-    project = db.query(Project).filter_by(id=project_id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    added = []
-    for username in schema.usernames:
-        name_str = username.lstrip("@")
-        user = db.query(TelegramUser).filter_by(chat_id=name_str).first()
-        if not user:
-            continue
-        pm = db.query(ProjectMember).filter_by(project_id=project_id, user_id=user.id).first()
-        if pm:
-            continue
-        new_pm = ProjectMember(project_id=project_id, user_id=user.id, role="member")
-        db.add(new_pm)
-        added.append(user.chat_id)
-    db.commit()
-    return {"added": added}
+async def add_members(project_id: int, schema: ProjectAddMembersSchema, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.add_members(db, project_id, schema.usernames)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
 @router.post("/projects/{project_id}/search")
-def project_search(project_id: int, req: SearchRequest, db: Session = Depends(get_db)):
-    pm = db.query(ProjectMember).filter_by(project_id=project_id, user_id=req.user_id).first()
-    if not pm:
-        raise HTTPException(status_code=403, detail="User not in project")
-
-    results = google_search(req.query, req.country, req.language, req.domain)
-    entry = SearchHistory(
-        project_id=project_id,
-        user_id=req.user_id,
-        query_text=req.query,
-        results_json=json.dumps(results)
+async def project_search(project_id: int, req: SearchRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        outcome = await project_service.search(
+            db, project_id, req.user_id, req.query, req.country, req.language, req.domain, req.depth
+        )
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # The stored JSON text is passed through as-is instead of being parsed and re-serialized.
+    return Response(
+        content=f'{{"ok": true, "entry_id": {outcome["entry_id"]}, "results": {outcome["results_json"]}}}',
+        media_type="application/json",
     )
-    db.add(entry)
-    db.commit()
-    db.refresh(entry)
-    return {"ok": True, "entry_id": entry.id, "results": results}
+
+
+@router.post("/projects/{project_id}/search/batch")
+async def project_search_batch(project_id: int, req: BatchSearchRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.search_batch(
+            db, project_id, req.user_id, [item.dict() for item in req.queries], req.include_results
+        )
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
 @router.get("/projects/{project_id}/history")
-def get_history(project_id: int, db: Session = Depends(get_db)):
-    items = db.query(SearchHistory).filter_by(project_id=project_id) \
-        .order_by(SearchHistory.created_at.desc()).all()
-    output = []
-    for h in items:
-        output.append({
-            "id": h.id,
-            "query_text": h.query_text,
-            "created_at": str(h.created_at)
-        })
-    return output
+async def get_history(project_id: int, limit: int = project_service.HISTORY_PAGE_SIZE,
+                      cursor: Optional[str] = None, direction: str = Query("next", pattern="^(next|prev)$"),
+                      db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.get_history(db, project_id, limit, cursor, direction)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
 @router.get("/projects/{project_id}/history/{item_id}")
-def get_history_item(project_id: int, item_id: int, db: Session = Depends(get_db)):
-    item = db.query(SearchHistory).filter_by(project_id=project_id, id=item_id).first()
-    if not item:
-        raise HTTPException(status_code=404, detail="Not found")
-    return {
-        "id": item.id,
-        "query_text": item.query_text,
-        "created_at": str(item.created_at),
-        "results": item.results_json
-    }
+async def get_history_item(project_id: int, item_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.get_history_item(db, project_id, item_id)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.get("/projects/{project_id}/rank")
+async def get_rank_series(project_id: int, user_id: int, domain: str, query: Optional[str] = None,
+                          date_from: Optional[date] = None, date_to: Optional[date] = None,
+                          db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.rank_series(db, project_id, user_id, domain, query, date_from, date_to)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.get("/projects/{project_id}/visibility")
+async def get_visibility(project_id: int, user_id: int, domain: str, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.visibility(db, project_id, user_id, domain, date_from, date_to)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.post("/projects/{project_id}/summary")
+async def project_summary(project_id: int, req: SummaryRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        summary = await project_service.summarize(db, project_id, req.user_id, req.date_from, req.date_to)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"ok": True, **summary}
+
+
+@router.get("/projects/{project_id}/summary/{task_id}")
+async def project_summary_result(project_id: int, task_id: str, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    try:
+        summary = await project_service.summary_result(db, project_id, user_id, task_id)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return {"ok": True, **summary}
+
+
+@router.get("/projects/{project_id}/export")
+async def export_history(project_id: int, user_id: int, format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                         flatten: bool = False, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         query: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        await project_service.ensure_member(db, project_id, user_id)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return StreamingResponse(
+        stream_history(project_id, format, flatten, date_from, date_to, query),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="project_{project_id}_history.{format}"'},
+    )
 
 
-class ScheduleData(BaseModel):
-    user_id: int
-    query: str
-    schedule_type: str
-    date_time: str = None
-    interval_seconds: int = None
-    country: str = "US"
-    language: str = "en"
-    domain: str = "google.com"
+@router.get("/projects/{project_id}/export.xlsx")
+async def export_project(project_id: int, user_id: int, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        path = await project_service.export_project(db, project_id, user_id, date_from, date_to)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"project_{project_id}.xlsx",
+        background=BackgroundTask(os.remove, path),
+    )
 
 
 @router.post("/projects/{project_id}/schedule")
-def schedule_search(project_id: int, data: ScheduleData, db: Session = Depends(get_db)):
-    pm = db.query(ProjectMember).filter_by(project_id=project_id, user_id=data.user_id).first()
-    if not pm:
-        raise HTTPException(status_code=403, detail="User not in project")
-
-    if data.schedule_type == "clocked":
-        try:
-            scheduled_dt = datetime.fromisoformat(data.date_time)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail="Invalid date_time format")
-        schedule_obj = db.query(ClockedSchedule).filter_by(clocked_time=scheduled_dt).first()
-        if not schedule_obj:
-            schedule_obj = ClockedSchedule(clocked_time=scheduled_dt)
-            db.add(schedule_obj)
-            db.commit()
-            db.refresh(schedule_obj)
-        one_off = True
-    else:  # interval
-        schedule_obj = db.query(IntervalSchedule).filter_by(every=data.interval_seconds, period="seconds").first()
-        if not schedule_obj:
-            schedule_obj = IntervalSchedule(every=data.interval_seconds, period="seconds")
-            db.add(schedule_obj)
-            db.commit()
-            db.refresh(schedule_obj)
-        one_off = False
-
-    task_name = f"project_search_{project_id}_{data.user_id}_{data.query[:10]}"
-    task = db.query(PeriodicTask).filter_by(name=task_name).first()
-    if not task:
-        task = PeriodicTask(
-            name=task_name,
-            task="managers.project_tasks.scheduled_search_task",
-            one_off=one_off,
-            enabled=True
-        )
-        db.add(task)
-
-    task.kwargs = json.dumps({
-        "project_id": project_id,
-        "user_id": data.user_id,
-        "query": data.query,
-        "country": data.country,
-        "language": data.language,
-        "domain": data.domain
-    })
-    task.schedule_model = schedule_obj
-    task.start_time = datetime.utcnow()
-    db.commit()
-    db.refresh(task)
-    PeriodicTaskChanged.update_from_session(db)
-    return {"scheduled": True, "message": f"The request is scheduled with the type {data.schedule_type}"}
\ No newline at end of file
+async def schedule_search(project_id: int, data: ScheduleData, db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await project_service.schedule_search(db, project_id, **data.dict())
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
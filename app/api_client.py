@@ -0,0 +1,50 @@
+import os
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+WEB_API_URL = os.getenv("WEB_API_URL", "http://app:8000")
+BOT_API_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT", "30"))
+# Read timeout for exports, which send nothing until the workbook is built; 0 waits indefinitely.
+BOT_EXPORT_TIMEOUT = float(os.getenv("BOT_EXPORT_TIMEOUT", "600")) or None
+BOT_API_MAX_CONNECTIONS = int(os.getenv("BOT_API_MAX_CONNECTIONS", "50"))
+BOT_API_HTTP2 = os.getenv("BOT_API_HTTP2", "0") == "1"
+
+_client = None
+
+
+def _http2_available() -> bool:
+    if not BOT_API_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("BOT_API_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        return False
+
+
+def get_api_client() -> httpx.AsyncClient:
+    # One keep-alive pool per bot process for every call to the web API.
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=WEB_API_URL,
+            timeout=BOT_API_TIMEOUT,
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=BOT_API_MAX_CONNECTIONS,
+                max_keepalive_connections=BOT_API_MAX_CONNECTIONS,
+                keepalive_expiry=30,
+            ),
+        )
+    return _client
+
+
+async def close_api_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,199 @@
+import os
+import tempfile
+from datetime import date
+
+import httpx
+
+from app.api_client import get_api_client, BOT_API_TIMEOUT, BOT_EXPORT_TIMEOUT
+from services.cache import LRUTTLCache
+from services.project_service import ServiceError
+
+# "http" goes through the web API; "embedded" calls the service layer in-process on its own
+# async DB pool, so small deployments can run the bot without the API.
+BOT_BACKEND = os.getenv("BOT_BACKEND", "http")
+BOT_IDENTITY_TTL = int(os.getenv("BOT_IDENTITY_TTL", "300"))
+BOT_PROJECTS_TTL = int(os.getenv("BOT_PROJECTS_TTL", "60"))
+
+
+class HttpBackend:
+    # Raises ServiceError with the API status and body, like the embedded backend does.
+
+    @staticmethod
+    def _json(resp):
+        if resp.status_code != 200:
+            raise ServiceError(resp.status_code, resp.text)
+        return resp.json()
+
+    async def start_bot(self, chat_id: str) -> dict:
+        return self._json(await get_api_client().post("/bot/start", json={"chat_id": chat_id}))
+
+    async def stop_bot(self, chat_id: str) -> dict:
+        return self._json(await get_api_client().post("/bot/stop", params={"chat_id": chat_id}))
+
+    async def find_user_id(self, chat_id: str) -> int | None:
+        resp = await get_api_client().get("/api/bot/find_user_by_chat_id", params={"chat_id": chat_id})
+        if resp.status_code == 200:
+            data = resp.json()
+            if "error" not in data:
+                return data["id"]
+        return None
+
+    async def user_projects(self, user_id: int) -> list:
+        return self._json(await get_api_client().get(f"/api/users/{user_id}/projects"))
+
+    async def create_project(self, user_id: int, name: str) -> dict:
+        return self._json(await get_api_client().post(
+            "/api/projects/create", params={"user_id": user_id}, json={"name": name}
+        ))
+
+    async def add_members(self, project_id, usernames: list) -> dict:
+        return self._json(await get_api_client().post(
+            f"/api/projects/{project_id}/add_members", json={"usernames": usernames}
+        ))
+
+    async def project_search(self, project_id, payload: dict) -> dict:
+        resp = await get_api_client().post(f"/api/projects/{project_id}/search", json=payload)
+        return self._json(resp).get("results", {})
+
+    async def history(self, project_id, cursor: str = None, direction: str = "next") -> dict:
+        params = {"direction": direction}
+        if cursor:
+            params["cursor"] = cursor
+        return self._json(await get_api_client().get(f"/api/projects/{project_id}/history", params=params))
+
+    async def history_item(self, project_id, item_id) -> dict:
+        return self._json(await get_api_client().get(f"/api/projects/{project_id}/history/{item_id}"))
+
+    async def schedule(self, project_id, payload: dict) -> dict:
+        return self._json(await get_api_client().post(f"/api/projects/{project_id}/schedule", json=payload))
+
+    async def export_project(self, project_id, user_id: int, date_from: str = None, date_to: str = None) -> str:
+        params = {"user_id": user_id}
+        params.update({k: v for k, v in (("date_from", date_from), ("date_to", date_to)) if v})
+        timeout = httpx.Timeout(BOT_API_TIMEOUT, read=BOT_EXPORT_TIMEOUT)
+        async with get_api_client().stream("GET", f"/api/projects/{project_id}/export.xlsx", params=params,
+                                           timeout=timeout) as resp:
+            if resp.status_code != 200:
+                raise ServiceError(resp.status_code, (await resp.aread()).decode(errors="replace"))
+            fd, path = tempfile.mkstemp(suffix=".xlsx")
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in resp.aiter_bytes():
+                    out.write(chunk)
+        return path
+
+
+class EmbeddedBackend:
+    # Same calls as HttpBackend, served by the service layer without serializing over HTTP.
+    # Imports are deferred so the http backend does not need asyncpg or the DB settings.
+
+    def __init__(self):
+        from db.async_database import AsyncSessionLocal
+        from db.serializers.telegram_user import TelegramUserStart
+        from services import bot_service, project_service
+        self.session = AsyncSessionLocal
+        self.start_schema = TelegramUserStart
+        self.bot_service = bot_service
+        self.project_service = project_service
+
+    async def start_bot(self, chat_id: str) -> dict:
+        async with self.session() as db:
+            user_data = self.start_schema(chat_id=chat_id)
+            return await self.bot_service.start_bot(db, user_data.chat_id, user_data.message_text)
+
+    async def stop_bot(self, chat_id: str) -> dict:
+        async with self.session() as db:
+            return await self.bot_service.stop_bot(db, chat_id)
+
+    async def find_user_id(self, chat_id: str) -> int | None:
+        async with self.session() as db:
+            user = await self.project_service.find_user_by_chat_id(db, chat_id)
+            return user.id if user else None
+
+    async def user_projects(self, user_id: int) -> list:
+        async with self.session() as db:
+            return await self.project_service.get_user_projects(db, user_id)
+
+    async def create_project(self, user_id: int, name: str) -> dict:
+        async with self.session() as db:
+            return await self.project_service.create_project(db, name, user_id)
+
+    async def add_members(self, project_id, usernames: list) -> dict:
+        async with self.session() as db:
+            return await self.project_service.add_members(db, int(project_id), usernames)
+
+    async def project_search(self, project_id, payload: dict) -> dict:
+        async with self.session() as db:
+            outcome = await self.project_service.search(db, int(project_id), **payload)
+        return outcome["results"]
+
+    async def history(self, project_id, cursor: str = None, direction: str = "next") -> dict:
+        async with self.session() as db:
+            return await self.project_service.get_history(
+                db, int(project_id), cursor=cursor, direction=direction
+            )
+
+    async def history_item(self, project_id, item_id) -> dict:
+        async with self.session() as db:
+            return await self.project_service.get_history_item(db, int(project_id), int(item_id))
+
+    async def schedule(self, project_id, payload: dict) -> dict:
+        async with self.session() as db:
+            return await self.project_service.schedule_search(db, int(project_id), **payload)
+
+    async def export_project(self, project_id, user_id: int, date_from: str = None, date_to: str = None) -> str:
+        async with self.session() as db:
+            return await self.project_service.export_project(
+                db, int(project_id), user_id,
+                date.fromisoformat(date_from) if date_from else None,
+                date.fromisoformat(date_to) if date_to else None,
+            )
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = EmbeddedBackend() if BOT_BACKEND == "embedded" else HttpBackend()
+    return _backend
+
+
+# Only positive lookups are cached, so a user who has not done /start yet is picked up right after.
+_user_ids = LRUTTLCache(10000, BOT_IDENTITY_TTL)
+_user_projects = LRUTTLCache(10000, BOT_PROJECTS_TTL)
+
+
+async def get_user_id_by_chat_id(chat_id: str) -> int | None:
+    chat_id = str(chat_id)
+    user_id = _user_ids.get(chat_id)
+    if user_id is not None:
+        return user_id
+    user_id = await get_backend().find_user_id(chat_id)
+    if user_id is not None:
+        _user_ids.set(chat_id, user_id)
+    return user_id
+
+
+async def get_user_projects(user_id: int) -> list | None:
+    projects = _user_projects.get(str(user_id))
+    if projects is not None:
+        return projects
+    try:
+        projects = await get_backend().user_projects(user_id)
+    except ServiceError:
+        return None
+    _user_projects.set(str(user_id), projects)
+    return projects
+
+
+def invalidate_user(chat_id: str):
+    _user_ids.delete(str(chat_id))
+
+
+def invalidate_projects(user_id: int = None):
+    # Adding members changes other users' project lists, whose ids the bot does not know here.
+    if user_id is None:
+        _user_projects.clear()
+    else:
+        _user_projects.delete(str(user_id))
@@ -0,0 +1,138 @@
+import os
+import asyncio
+import logging
+
+import redis
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from services.cache import LRUTTLCache
+from services.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+BOT_WEBHOOK_HOST = os.getenv("BOT_WEBHOOK_HOST", "0.0.0.0")
+BOT_WEBHOOK_PORT = int(os.getenv("BOT_WEBHOOK_PORT", "8081"))
+BOT_WEBHOOK_PATH = os.getenv("BOT_WEBHOOK_PATH", "/telegram/webhook")
+# Public base URL Telegram should call, e.g. https://bot.example.com; empty leaves the webhook as is.
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")
+BOT_WEBHOOK_WORKERS = int(os.getenv("BOT_WEBHOOK_WORKERS", "32"))
+BOT_WEBHOOK_QUEUE_SIZE = int(os.getenv("BOT_WEBHOOK_QUEUE_SIZE", "1000"))
+BOT_UPDATE_DEDUPE_TTL = int(os.getenv("BOT_UPDATE_DEDUPE_TTL", "3600"))
+
+
+class WebhookDispatcher:
+    # Accepts updates over HTTP and feeds them to the dispatcher through a bounded worker pool.
+    # Telegram redelivers an update until it gets a 2xx, and with several replicas behind one
+    # token the retry may land elsewhere, so update_id is claimed in Redis before queueing.
+    # A full queue answers 503 without claiming, which makes Telegram retry later.
+
+    def __init__(self, bot: Bot, dp: Dispatcher, workers: int = BOT_WEBHOOK_WORKERS,
+                 queue_size: int = BOT_WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.dp = dp
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.counters = {"received": 0, "duplicates": 0, "rejected": 0, "handled": 0, "errors": 0}
+        self._seen = LRUTTLCache(queue_size * 10, BOT_UPDATE_DEDUPE_TTL)
+        self._tasks = []
+
+    async def _claim(self, update_id: int) -> bool:
+        try:
+            claimed = await get_async_redis().set(
+                f"bot:update:{update_id}", 1, nx=True, ex=BOT_UPDATE_DEDUPE_TTL
+            )
+            return bool(claimed)
+        except redis.RedisError as e:
+            logger.warning(f"[webhook] Redis unavailable, deduplicating locally: {e}")
+            if self._seen.get(str(update_id)):
+                return False
+            self._seen.set(str(update_id), True)
+            return True
+
+    async def _release(self, update_id: int):
+        self._seen.delete(str(update_id))
+        try:
+            await get_async_redis().delete(f"bot:update:{update_id}")
+        except redis.RedisError:
+            pass
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if BOT_WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != BOT_WEBHOOK_SECRET:
+            return web.Response(status=401)
+        data = await request.json()
+        update_id = data.get("update_id")
+        if update_id is None:
+            return web.Response(status=400)
+        self.counters["received"] += 1
+
+        if self.queue.full():
+            self.counters["rejected"] += 1
+            return web.Response(status=503)
+        if not await self._claim(update_id):
+            self.counters["duplicates"] += 1
+            return web.Response(status=200)
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            await self._release(update_id)
+            self.counters["rejected"] += 1
+            return web.Response(status=503)
+        return web.Response(status=200)
+
+    async def _worker(self):
+        while True:
+            data = await self.queue.get()
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                await self.dp.feed_update(self.bot, update)
+                self.counters["handled"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"[webhook] Failed to handle update {data.get('update_id')}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.counters, "queued": self.queue.qsize()})
+
+    async def on_startup(self, app: web.Application):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if BOT_WEBHOOK_URL:
+            await self.bot.set_webhook(
+                BOT_WEBHOOK_URL.rstrip("/") + BOT_WEBHOOK_PATH,
+                secret_token=BOT_WEBHOOK_SECRET or None,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=100,
+            )
+
+    async def on_shutdown(self, app: web.Application):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning(f"[webhook] Shutting down with {self.queue.qsize()} updates unhandled")
+        for task in self._tasks:
+            task.cancel()
+        await self.bot.session.close()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(BOT_WEBHOOK_PATH, self.handle)
+        app.router.add_get("/healthz", self.health)
+        app.on_startup.append(self.on_startup)
+        app.on_shutdown.append(self.on_shutdown)
+        return app
+
+
+async def serve_webhook(bot: Bot, dp: Dispatcher):
+    runner = web.AppRunner(WebhookDispatcher(bot, dp).create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, BOT_WEBHOOK_HOST, BOT_WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook listening on {BOT_WEBHOOK_HOST}:{BOT_WEBHOOK_PORT}{BOT_WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -4,7 +4,9 @@ from celery import Celery
 CELERY_BEAT_SCHEDULER = "sqlalchemy_celery_beat.schedulers:DatabaseScheduler"
 
 broker_url = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
-result_backend = os.getenv("DATABASE_URL", broker_url)
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Celery's database backend wants the "db+" scheme; a bare SQLAlchemy URL is read as a backend module name.
+result_backend = os.getenv("CELERY_RESULT_BACKEND") or (f"db+{DATABASE_URL}" if DATABASE_URL else broker_url)
 
 celery_app = Celery("worker", broker=broker_url, backend=result_backend)
 
@@ -19,14 +21,19 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     beat_scheduler=CELERY_BEAT_SCHEDULER,
-    sqlalchemy_scheduler_connection_uri=os.getenv("DATABASE_URL"),
+    sqlalchemy_scheduler_connection_uri=DATABASE_URL,
     sqlalchemy_scheduler_table_schema="celery_schema",
     task_default_queue='celery',
     task_default_exchange='celery',
     task_default_routing_key='celery',
+    # LLM calls are slow and bursty; they run on their own queue so AI workers scale separately.
+    task_routes={"managers.ai_tasks.*": {"queue": "ai"}},
 )
 
-celery_app.autodiscover_tasks(["managers.telegram_manager", "managers.project_tasks"], force=True)
+celery_app.autodiscover_tasks(["managers.telegram_manager", "managers.project_tasks", "managers.ai_tasks"], force=True)
 
-from managers.telegram_manager import send_message_task
-from managers.project_tasks import scheduled_search_task
+# Plain module imports register the tasks and still work when a managers module is imported
+# first (the bot imports managers.ai_tasks before this module has finished loading).
+import managers.telegram_manager  # noqa: E402,F401
+import managers.project_tasks  # noqa: E402,F401
+import managers.ai_tasks  # noqa: E402,F401
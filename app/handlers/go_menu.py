@@ -1,6 +1,4 @@
 import logging
-import os
-import httpx
 
 from aiogram import Router, types, F
 from aiogram.filters import Command
@@ -9,23 +7,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
 
 from app.handlers.states import GoMenuStates, ProjectMenuStates
+from app.backend import get_backend, get_user_id_by_chat_id, get_user_projects, invalidate_projects
+from services.project_service import ServiceError
 
-WEB_API_URL = os.getenv("WEB_API_URL", "http://app:8000")
 logger = logging.getLogger(__name__)
 router = Router()
 
 
-async def get_user_id_by_chat_id(chat_id: str) -> int | None:
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/bot/find_user_by_chat_id?chat_id={chat_id}"
-        resp = await client.get(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            if "error" not in data:
-                return data["id"]
-    return None
-
-
 @router.message(Command("go"))
 async def cmd_go(message: types.Message, state: FSMContext):
     builder = InlineKeyboardBuilder()
@@ -56,21 +44,19 @@ async def process_create_project_name(message: types.Message, state: FSMContext)
         await state.set_state(GoMenuStates.main_menu)
         return
 
-    payload = {"name": project_name}
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/projects/create?user_id={user_id}"
-        resp = await client.post(url, json=payload)
-        if resp.status_code == 200:
-            data = resp.json()
-            project_id = data["project_id"]
-            await state.update_data(project_id=project_id)
-            await message.answer(
-                f"Project created (ID={project_id}). Enter members (@username) separated by space:"
-            )
-            await state.set_state(GoMenuStates.adding_members)
-        else:
-            await message.answer("Project creation failed.")
-            await state.set_state(GoMenuStates.main_menu)
+    try:
+        data = await get_backend().create_project(user_id, project_name)
+    except ServiceError:
+        await message.answer("Project creation failed.")
+        await state.set_state(GoMenuStates.main_menu)
+        return
+    project_id = data["project_id"]
+    invalidate_projects(user_id)
+    await state.update_data(project_id=project_id)
+    await message.answer(
+        f"Project created (ID={project_id}). Enter members (@username) separated by space:"
+    )
+    await state.set_state(GoMenuStates.adding_members)
 
 
 @router.message(GoMenuStates.adding_members)
@@ -79,19 +65,16 @@ async def process_adding_members(message: types.Message, state: FSMContext):
     project_id = user_data.get("project_id")
     splitted = message.text.split()
 
-    payload = {"usernames": splitted}
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/projects/{project_id}/add_members"
-        r = await client.post(url, json=payload)
-        if r.status_code == 200:
-            d = r.json()
-            added = d["added"]
-            await message.answer(f"Users added: {added}")
-        else:
-            await message.answer("Error adding users.")
+    try:
+        d = await get_backend().add_members(project_id, splitted)
+        added = d["added"]
+        invalidate_projects()
+        await message.answer(f"Users added: {added}")
+    except ServiceError:
+        await message.answer("Error adding users.")
 
     await message.answer(
-        "The project is ready. You can make queries here, /history, /schedule."
+        "The project is ready. You can make queries here, /history, /schedule, /summary, /export."
         "\nEnter the command /projectsearch to start search."
     )
     await state.set_state(ProjectMenuStates.menu)
@@ -106,26 +89,23 @@ async def choose_project_callback(callback: types.CallbackQuery, state: FSMConte
         await callback.answer()
         return
 
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/users/{user_id}/projects"
-        resp = await client.get(url)
-        if resp.status_code != 200:
-            await callback.message.answer("Mistake getting projects.")
-            await callback.answer()
-            return
-        projects = resp.json()
-        if not projects:
-            await callback.message.answer("No projects found.")
-            await callback.answer()
-            return
-
-        builder = InlineKeyboardBuilder()
-        for p in projects:
-            cb_data = f"selectproj:{p['id']}"
-            builder.add(InlineKeyboardButton(text=p["name"], callback_data=cb_data))
-        builder.adjust(1)
-
-        await callback.message.answer("YOUR PROJECTS:", reply_markup=builder.as_markup())
+    projects = await get_user_projects(user_id)
+    if projects is None:
+        await callback.message.answer("Mistake getting projects.")
+        await callback.answer()
+        return
+    if not projects:
+        await callback.message.answer("No projects found.")
+        await callback.answer()
+        return
+
+    builder = InlineKeyboardBuilder()
+    for p in projects:
+        cb_data = f"selectproj:{p['id']}"
+        builder.add(InlineKeyboardButton(text=p["name"], callback_data=cb_data))
+    builder.adjust(1)
+
+    await callback.message.answer("YOUR PROJECTS:", reply_markup=builder.as_markup())
     await callback.answer()
 
 
@@ -136,7 +116,7 @@ async def callback_select_project(callback: types.CallbackQuery, state: FSMConte
     await state.update_data(project_id=project_id)
     await callback.message.answer(
         f"Project {project_id} selected.\n"
-        "Use /projectsearch, /history, /schedule."
+        "Use /projectsearch, /history, /schedule, /summary, /export."
     )
     await state.set_state(ProjectMenuStates.menu)
     await callback.answer()
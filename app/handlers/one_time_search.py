@@ -1,6 +1,5 @@
 import logging
-import io
-import xlsxwriter
+import os
 
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
@@ -10,17 +9,27 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config.countries import COUNTRIES
 from config.languages import LANGUAGES
 from config.domains import DOMAINS
+from config.depths import DEPTHS
 
 from app.handlers.states import OneTimeSearchStates
+from app.handlers.serp_format import organic_result_messages
 
-from services.serper_service import google_search
+from services.serper_service import async_google_search
+from services.deep_search import async_deep_search, SERP_PAGE_SIZE
 
-from services.openai_service import analyze_results_with_openai
+from services.openai_service import cached_analysis
+from services.telegram_stream import as_chunks
+from services.result_store import ResultStore
+from services.excel_export import export_results_xlsx
+from managers.ai_tasks import analyze_results_task, deliver_analysis
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-search_cache = {}
+search_cache = ResultStore("bot:results:onetime")
+
+# Buttons sent after an analysis, also by the AI worker, so kept JSON-serializable.
+ONETIME_ACTIONS = [["Repeat", "repeat_search"], ["Exit", "exit"]]
 
 
 @router.callback_query(F.data == "go_once")
@@ -79,6 +88,22 @@ async def onetime_domain(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(domain=callback.data)
     await callback.message.edit_text(f"Domain selected: {callback.data}")
 
+    builder = InlineKeyboardBuilder()
+    for depth_label, depth_cb in DEPTHS:
+        builder.add(types.InlineKeyboardButton(text=depth_label, callback_data=depth_cb))
+    builder.adjust(3)
+
+    await callback.message.answer("Select depth:", reply_markup=builder.as_markup())
+    await state.set_state(OneTimeSearchStates.waiting_for_depth)
+    await callback.answer()
+
+
+@router.callback_query(OneTimeSearchStates.waiting_for_depth)
+async def onetime_depth(callback: types.CallbackQuery, state: FSMContext):
+    depth = int(callback.data)
+    await state.update_data(depth=depth)
+    await callback.message.edit_text(f"Depth selected: {depth}")
+
     data = await state.get_data()
     query = data["search_query"]
     country = data["country"]
@@ -86,12 +111,15 @@ async def onetime_domain(callback: types.CallbackQuery, state: FSMContext):
     domain = data["domain"]
 
     try:
-        results = google_search(query=query, country=country, language=language, domain=domain)
+        if depth > SERP_PAGE_SIZE:
+            results = await async_deep_search(query, country, language, domain, depth)
+        else:
+            results = await async_google_search(query=query, country=country, language=language, domain=domain)
     except Exception as e:
         await callback.message.answer(f"Mistake serper query: {e}")
         return
 
-    search_cache[callback.from_user.id] = {"results": results}
+    await search_cache.set(callback.from_user.id, {"results": results})
 
     builder = InlineKeyboardBuilder()
     builder.add(types.InlineKeyboardButton(text="Show results", callback_data="show_results"))
@@ -105,20 +133,17 @@ async def onetime_domain(callback: types.CallbackQuery, state: FSMContext):
 
 @router.callback_query(OneTimeSearchStates.show_actions, F.data == "show_results")
 async def onetime_show_results(callback: types.CallbackQuery, state: FSMContext):
-    cdata = search_cache.get(callback.from_user.id)
+    cdata = await search_cache.get(callback.from_user.id)
     if not cdata:
         await callback.message.answer("No results.")
         await callback.answer()
         return
 
     organic = cdata["results"].get("organic", [])
-    text_for_user = "Top results:\n"
-    for idx, item in enumerate(organic[:10], start=1):
-        title = item.get("title", "")
-        link = item.get("link", "")
-        text_for_user += f"{idx}. {title}\n{link}\n\n"
-
-    await callback.message.answer(text_for_user or "Empty serp")
+    if not organic:
+        await callback.message.answer("Empty serp")
+    for text_for_user in organic_result_messages(organic, "Top results:\n"):
+        await callback.message.answer(text_for_user)
 
     builder = InlineKeyboardBuilder()
     builder.add(types.InlineKeyboardButton(text="Save Excel", callback_data="save_excel"))
@@ -132,57 +157,41 @@ async def onetime_show_results(callback: types.CallbackQuery, state: FSMContext)
 
 @router.callback_query(OneTimeSearchStates.show_actions, F.data == "analyze_results")
 async def onetime_analyze_results(callback: types.CallbackQuery, state: FSMContext):
-    cdata = search_cache.get(callback.from_user.id)
+    cdata = await search_cache.get(callback.from_user.id)
     if not cdata:
         await callback.message.answer("No data for analyze.")
         await callback.answer()
         return
 
+    await callback.answer()
+    chat_id = callback.message.chat.id
+    cached = await cached_analysis(cdata["results"])
+    if cached is not None:
+        await deliver_analysis(callback.bot, chat_id, as_chunks(cached), ONETIME_ACTIONS)
+        return
     try:
-        analyzed_text = analyze_results_with_openai(cdata["results"])
-        cdata["analyzed"] = analyzed_text
+        analyze_results_task.delay(chat_id, cdata["results"], ONETIME_ACTIONS)
     except Exception as e:
         await callback.message.answer(f"Mistake API onenAI: {e}")
-        await callback.answer()
         return
-
-    await callback.message.answer(f"Analyze result:\n{cdata['analyzed']}")
-
-    builder = InlineKeyboardBuilder()
-    builder.add(types.InlineKeyboardButton(text="Repeat", callback_data="repeat_search"))
-    builder.add(types.InlineKeyboardButton(text="Exit", callback_data="exit"))
-    builder.adjust(1)
-
-    await callback.message.answer("Action", reply_markup=builder.as_markup())
-    await callback.answer()
+    await callback.message.answer("Analysis started, the result will be sent here when it is ready.")
 
 
 @router.callback_query(OneTimeSearchStates.show_actions, F.data == "save_excel")
 async def onetime_save_excel(callback: types.CallbackQuery, state: FSMContext):
-    cdata = search_cache.get(callback.from_user.id)
+    cdata = await search_cache.get(callback.from_user.id)
     if not cdata:
         await callback.message.answer("No data for save.")
         await callback.answer()
         return
 
-    organic = cdata["results"].get("organic", [])
-
-    output = io.BytesIO()
-    wb = xlsxwriter.Workbook(output)
-    ws = wb.add_worksheet("Google Results (OneTime)")
-
-    ws.write(0, 0, "Title")
-    ws.write(0, 1, "Link")
-
-    for i, item in enumerate(organic[:10], start=1):
-        ws.write(i, 0, item.get("title", ""))
-        ws.write(i, 1, item.get("link", ""))
-
-    wb.close()
-    output.seek(0)
-
-    doc = FSInputFile(output, filename="google_results.xlsx")
-    await callback.message.answer_document(document=doc, caption="Excel with results")
+    await callback.answer()
+    path = await export_results_xlsx(cdata["results"])
+    try:
+        doc = FSInputFile(path, filename="google_results.xlsx")
+        await callback.message.answer_document(document=doc, caption="Excel with results")
+    finally:
+        os.remove(path)
 
     builder = InlineKeyboardBuilder()
     builder.add(types.InlineKeyboardButton(text="Repeat", callback_data="repeat_search"))
@@ -190,13 +199,11 @@ async def onetime_save_excel(callback: types.CallbackQuery, state: FSMContext):
     builder.adjust(1)
 
     await callback.message.answer("Action:", reply_markup=builder.as_markup())
-    await callback.answer()
 
 
 @router.callback_query(OneTimeSearchStates.show_actions, F.data == "repeat_search")
 async def onetime_repeat_search(callback: types.CallbackQuery, state: FSMContext):
-    if callback.from_user.id in search_cache:
-        del search_cache[callback.from_user.id]
+    await search_cache.delete(callback.from_user.id)
     await state.clear()
     await callback.message.answer("Repeat search. Enter your query:")
     await state.set_state(OneTimeSearchStates.waiting_for_query)
@@ -205,8 +212,7 @@ async def onetime_repeat_search(callback: types.CallbackQuery, state: FSMContext
 
 @router.callback_query(OneTimeSearchStates.show_actions, F.data == "exit")
 async def onetime_exit_search(callback: types.CallbackQuery, state: FSMContext):
-    if callback.from_user.id in search_cache:
-        del search_cache[callback.from_user.id]
+    await search_cache.delete(callback.from_user.id)
     await state.clear()
     await callback.message.answer("Search ended. Press /go again.")
     await callback.answer()
@@ -1,13 +1,10 @@
 import logging
 import os
-import io
 import json
-import xlsxwriter
-import httpx
 from datetime import datetime
 
 from aiogram import Router, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton, FSInputFile
@@ -22,27 +19,24 @@ from app.handlers.states import (
 from config.countries import COUNTRIES
 from config.languages import LANGUAGES
 from config.domains import DOMAINS
+from config.depths import DEPTHS
+from app.handlers.serp_format import organic_result_messages
+from app.backend import get_backend, get_user_id_by_chat_id
+from services.project_service import ServiceError
 
-from services.openai_service import analyze_results_with_openai
+from services.openai_service import cached_analysis
+from services.telegram_stream import as_chunks
+from services.result_store import ResultStore
+from services.excel_export import export_results_xlsx
+from managers.ai_tasks import analyze_results_task, summarize_project_task, deliver_analysis
 
 logger = logging.getLogger(__name__)
 router = Router()
 
-WEB_API_URL = os.getenv("WEB_API_URL", "http://app:8000")
+project_search_cache = ResultStore("bot:results:project")
 
-
-async def get_user_id_by_chat_id(chat_id: str) -> int | None:
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/bot/find_user_by_chat_id?chat_id={chat_id}"
-        r = await client.get(url)
-        if r.status_code == 200:
-            data = r.json()
-            if "error" not in data:
-                return data["id"]
-    return None
-
-
-project_search_cache = {}
+# Buttons sent after an analysis, also by the AI worker, so kept JSON-serializable.
+PROJECT_ACTIONS = [["Repeat", "proj_repeat_search"], ["Exit", "proj_exit"]]
 
 
 @router.message(ProjectMenuStates.menu, Command("projectsearch"))
@@ -94,6 +88,19 @@ async def project_language(callback: types.CallbackQuery, state: FSMContext):
 async def project_domain(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(domain=callback.data)
     await callback.message.edit_text(f"Domain selected: {callback.data}")
+    builder = InlineKeyboardBuilder()
+    for depth_lbl, depth_cb in DEPTHS:
+        builder.add(InlineKeyboardButton(text=depth_lbl, callback_data=depth_cb))
+    builder.adjust(3)
+    await callback.message.answer("Select depth:", reply_markup=builder.as_markup())
+    await state.set_state(ProjectSearchStates.waiting_for_depth)
+    await callback.answer()
+
+
+@router.callback_query(ProjectSearchStates.waiting_for_depth)
+async def project_depth(callback: types.CallbackQuery, state: FSMContext):
+    await state.update_data(depth=int(callback.data))
+    await callback.message.edit_text(f"Depth selected: {callback.data}")
 
     data = await state.get_data()
     project_id = data.get("project_id")
@@ -101,6 +108,7 @@ async def project_domain(callback: types.CallbackQuery, state: FSMContext):
     country = data["country"]
     language = data["language"]
     domain = data["domain"]
+    depth = data["depth"]
 
     chat_id = str(callback.from_user.id)
     user_id = await get_user_id_by_chat_id(chat_id)
@@ -113,19 +121,16 @@ async def project_domain(callback: types.CallbackQuery, state: FSMContext):
         "country": country,
         "language": language,
         "domain": domain,
+        "depth": depth,
         "user_id": user_id
     }
-    results = {}
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{WEB_API_URL}/api/projects/{project_id}/search", json=payload)
-        if r.status_code == 200:
-            d = r.json()
-            results = d.get("results", {})
-        else:
-            await callback.message.answer("Mistake query to Serper.")
-            return
+    try:
+        results = await get_backend().project_search(project_id, payload)
+    except ServiceError:
+        await callback.message.answer("Mistake query to Serper.")
+        return
 
-    project_search_cache[callback.from_user.id] = {"results": results}
+    await project_search_cache.set(callback.from_user.id, {"results": results})
 
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="View results", callback_data="show_results_proj"))
@@ -139,7 +144,7 @@ async def project_domain(callback: types.CallbackQuery, state: FSMContext):
 @router.callback_query(ProjectSearchStates.show_actions, F.data == "show_results_proj")
 async def project_show_results(callback: types.CallbackQuery, state: FSMContext):
     chat_id = callback.from_user.id
-    cdata = project_search_cache.get(chat_id)
+    cdata = await project_search_cache.get(chat_id)
     if not cdata:
         await callback.message.answer("No results.")
         await callback.answer()
@@ -147,13 +152,10 @@ async def project_show_results(callback: types.CallbackQuery, state: FSMContext)
 
     results = cdata["results"]
     organic_results = results.get("organic", [])
-    text_for_user = "Top results (Saved in project):\n"
-    for idx, item in enumerate(organic_results[:10], start=1):
-        title = item.get("title", "")
-        link = item.get("link", "")
-        text_for_user += f"{idx}. {title}\n{link}\n\n"
-
-    await callback.message.answer(text_for_user or "Empty serp query")
+    if not organic_results:
+        await callback.message.answer("Empty serp query")
+    for text_for_user in organic_result_messages(organic_results, "Top results (Saved in project):\n"):
+        await callback.message.answer(text_for_user)
 
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="Save Excel", callback_data="proj_save_excel"))
@@ -167,68 +169,53 @@ async def project_show_results(callback: types.CallbackQuery, state: FSMContext)
 @router.callback_query(ProjectSearchStates.show_actions, F.data == "analyze_results_proj")
 async def project_analyze_results(callback: types.CallbackQuery, state: FSMContext):
     chat_id = callback.from_user.id
-    cdata = project_search_cache.get(chat_id)
+    cdata = await project_search_cache.get(chat_id)
     if not cdata:
         await callback.message.answer("No data for analyze.")
         await callback.answer()
         return
 
     results = cdata["results"]
+    await callback.answer()
+    cached = await cached_analysis(results)
+    if cached is not None:
+        await deliver_analysis(callback.bot, chat_id, as_chunks(cached), PROJECT_ACTIONS)
+        return
     try:
-        analyzed_text = analyze_results_with_openai(results)
-        cdata["analyzed"] = analyzed_text
+        analyze_results_task.delay(chat_id, results, PROJECT_ACTIONS)
     except Exception as e:
         await callback.message.answer(f"Mistake sending in AI: {e}")
-        await callback.answer()
         return
-
-    await callback.message.answer(f"Analyze result:\n{cdata['analyzed']}")
-
-    builder = InlineKeyboardBuilder()
-    builder.add(InlineKeyboardButton(text="Repeat", callback_data="proj_repeat_search"))
-    builder.add(InlineKeyboardButton(text="Exit", callback_data="proj_exit"))
-    builder.adjust(1)
-    await callback.message.answer("Action:", reply_markup=builder.as_markup())
-    await callback.answer()
+    await callback.message.answer("Analysis started, the result will be sent here when it is ready.")
 
 
 @router.callback_query(ProjectSearchStates.show_actions, F.data == "proj_save_excel")
 async def project_save_excel(callback: types.CallbackQuery, state: FSMContext):
     chat_id = callback.from_user.id
-    cdata = project_search_cache.get(chat_id)
+    cdata = await project_search_cache.get(chat_id)
     if not cdata:
         await callback.message.answer("No data.")
         await callback.answer()
         return
 
-    organic = cdata["results"].get("organic", [])
-    output = io.BytesIO()
-    wb = xlsxwriter.Workbook(output)
-    ws = wb.add_worksheet("Google Results (Project)")
-
-    ws.write(0, 0, "Title")
-    ws.write(0, 1, "Link")
-    for i, item in enumerate(organic[:10], start=1):
-        ws.write(i, 0, item.get("title", ""))
-        ws.write(i, 1, item.get("link", ""))
-    wb.close()
-    output.seek(0)
-
-    doc = FSInputFile(output, filename="project_google_results.xlsx")
-    await callback.message.answer_document(document=doc, caption="Excel with results.")
+    await callback.answer()
+    path = await export_results_xlsx(cdata["results"])
+    try:
+        doc = FSInputFile(path, filename="project_google_results.xlsx")
+        await callback.message.answer_document(document=doc, caption="Excel with results.")
+    finally:
+        os.remove(path)
 
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="Repeat", callback_data="proj_repeat_search"))
     builder.add(InlineKeyboardButton(text="Exit", callback_data="proj_exit"))
     builder.adjust(1)
     await callback.message.answer("Action:", reply_markup=builder.as_markup())
-    await callback.answer()
 
 
 @router.callback_query(ProjectSearchStates.show_actions, F.data == "proj_repeat_search")
 async def project_repeat_search(callback: types.CallbackQuery, state: FSMContext):
-    if callback.from_user.id in project_search_cache:
-        del project_search_cache[callback.from_user.id]
+    await project_search_cache.delete(callback.from_user.id)
     await state.set_state(ProjectSearchStates.waiting_for_query)
     await callback.message.answer("Repeat search in project. Please enter new query.")
     await callback.answer()
@@ -236,33 +223,56 @@ async def project_repeat_search(callback: types.CallbackQuery, state: FSMContext
 
 @router.callback_query(ProjectSearchStates.show_actions, F.data == "proj_exit")
 async def project_exit_search(callback: types.CallbackQuery, state: FSMContext):
-    if callback.from_user.id in project_search_cache:
-        del project_search_cache[callback.from_user.id]
-    await callback.message.answer("You close project search. You can press /history, /schedule.")
+    await project_search_cache.delete(callback.from_user.id)
+    await callback.message.answer("You close project search. You can press /history, /schedule, /summary, /export.")
     await state.set_state(ProjectMenuStates.menu)
     await callback.answer()
 
 
+def history_markup(page: dict):
+    builder = InlineKeyboardBuilder()
+    for h in page["items"]:
+        cb_data = f"history_item:{h['id']}"
+        btn_text = f"{h['query_text'][:20]} от {h['created_at']}"
+        builder.row(InlineKeyboardButton(text=btn_text, callback_data=cb_data))
+    nav = []
+    if page.get("prev_cursor"):
+        nav.append(InlineKeyboardButton(text="« Prev", callback_data=f"history_page:prev:{page['prev_cursor']}"))
+    if page.get("next_cursor"):
+        nav.append(InlineKeyboardButton(text="Next »", callback_data=f"history_page:next:{page['next_cursor']}"))
+    if nav:
+        builder.row(*nav)
+    return builder.as_markup()
+
+
 @router.message(ProjectMenuStates.menu, Command("history"))
 async def cmd_history_in_project(message: types.Message, state: FSMContext):
     data = await state.get_data()
     project_id = data.get("project_id")
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{WEB_API_URL}/api/projects/{project_id}/history")
-    if r.status_code != 200:
+    try:
+        page = await get_backend().history(project_id)
+    except ServiceError:
         await message.answer("Mistake ger history.")
         return
-    hist_list = r.json()
-    if not hist_list:
+    if not page["items"]:
         await message.answer("History empty.")
         return
-    builder = InlineKeyboardBuilder()
-    for idx, h in enumerate(hist_list, start=1):
-        cb_data = f"history_item:{h['id']}"
-        btn_text = f"{idx}. {h['query_text'][:20]} от {h['created_at']}"
-        builder.add(InlineKeyboardButton(text=btn_text, callback_data=cb_data))
-    builder.adjust(1)
-    await message.answer("History:", reply_markup=builder.as_markup())
+    await message.answer("History:", reply_markup=history_markup(page))
+
+
+@router.callback_query(ProjectMenuStates.menu, F.data.startswith("history_page:"))
+async def callback_history_page(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    project_id = data.get("project_id")
+    _, direction, cursor = callback.data.split(":", 2)
+    try:
+        page = await get_backend().history(project_id, cursor, direction)
+    except ServiceError:
+        await callback.answer("Mistake ger history.")
+        return
+    if page["items"]:
+        await callback.message.edit_reply_markup(reply_markup=history_markup(page))
+    await callback.answer()
 
 
 @router.callback_query(ProjectMenuStates.menu, F.data.startswith("history_item:"))
@@ -270,32 +280,75 @@ async def callback_history_item(callback: types.CallbackQuery, state: FSMContext
     data = await state.get_data()
     project_id = data.get("project_id")
     item_id = callback.data.split(":")[1]
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/projects/{project_id}/history/{item_id}"
-        resp = await client.get(url)
-    if resp.status_code != 200:
+    try:
+        item = await get_backend().history_item(project_id, item_id)
+    except ServiceError:
         await callback.message.answer("Mistak for get.")
         await callback.answer()
         return
-    item = resp.json()
     results_str = item.get("results", "{}")
     try:
         results_json = json.loads(results_str)
     except:
         results_json = {}
     organic = results_json.get("organic", [])
-    text_for_user = f"Query: {item['query_text']}\n\n"
+    header = f"Query: {item['query_text']}\n\n"
     if not organic:
-        text_for_user += "No results."
-    else:
-        for i, entry in enumerate(organic[:10], start=1):
-            title = entry.get("title", "")
-            link = entry.get("link", "")
-            text_for_user += f"{i}. {title}\n{link}\n\n"
-    await callback.message.answer(text_for_user)
+        await callback.message.answer(header + "No results.")
+    for text_for_user in organic_result_messages(organic, header):
+        await callback.message.answer(text_for_user)
     await callback.answer()
 
 
+def _parse_date_range(args: str | None) -> tuple:
+    dates = [datetime.strptime(a, "%Y-%m-%d").date().isoformat() for a in (args or "").split()[:2]]
+    return (dates[0] if dates else None), (dates[1] if len(dates) > 1 else None)
+
+
+@router.message(ProjectMenuStates.menu, Command("summary"))
+async def cmd_summary_in_project(message: types.Message, state: FSMContext, command: CommandObject):
+    data = await state.get_data()
+    project_id = data.get("project_id")
+    try:
+        date_from, date_to = _parse_date_range(command.args)
+    except ValueError:
+        await message.answer("Format: /summary [YYYY-MM-DD] [YYYY-MM-DD]")
+        return
+    try:
+        summarize_project_task.delay(message.chat.id, project_id, date_from, date_to)
+    except Exception as e:
+        await message.answer(f"Mistake sending in AI: {e}")
+        return
+    await message.answer("Summary started, the report will be sent here when it is ready.")
+
+
+@router.message(ProjectMenuStates.menu, Command("export"))
+async def cmd_export_in_project(message: types.Message, state: FSMContext, command: CommandObject):
+    data = await state.get_data()
+    project_id = data.get("project_id")
+    try:
+        date_from, date_to = _parse_date_range(command.args)
+    except ValueError:
+        await message.answer("Format: /export [YYYY-MM-DD] [YYYY-MM-DD]")
+        return
+    user_id = await get_user_id_by_chat_id(str(message.from_user.id))
+    if user_id is None:
+        await message.answer("You are not registered (do /start).")
+        return
+
+    await message.answer("Preparing export...")
+    try:
+        path = await get_backend().export_project(project_id, user_id, date_from, date_to)
+    except ServiceError as e:
+        await message.answer(f"Export error: {e.detail}")
+        return
+    try:
+        doc = FSInputFile(path, filename=f"project_{project_id}.xlsx")
+        await message.answer_document(document=doc, caption="Project history export.")
+    finally:
+        os.remove(path)
+
+
 @router.message(ProjectMenuStates.menu, Command("schedule"))
 async def cmd_schedule_in_project(message: types.Message, state: FSMContext):
     await message.answer(
@@ -334,7 +387,8 @@ async def process_schedule_input(message: types.Message, state: FSMContext):
             "date_time": dt_str,
             "country": (await state.get_data()).get("country", "US"),
             "language": (await state.get_data()).get("language", "en"),
-            "domain": (await state.get_data()).get("domain", "google.com")
+            "domain": (await state.get_data()).get("domain", "google.com"),
+            "depth": (await state.get_data()).get("depth", 10)
         }
     elif schedule_type == "interval":
         parts = text.split(" ", 2)
@@ -354,7 +408,8 @@ async def process_schedule_input(message: types.Message, state: FSMContext):
             "interval_seconds": interval_seconds,
             "country": (await state.get_data()).get("country", "US"),
             "language": (await state.get_data()).get("language", "en"),
-            "domain": (await state.get_data()).get("domain", "google.com")
+            "domain": (await state.get_data()).get("domain", "google.com"),
+            "depth": (await state.get_data()).get("depth", 10)
         }
     else:
         await message.answer("Unknown schedule type. Use 'clocked' or 'interval'.")
@@ -369,11 +424,9 @@ async def process_schedule_input(message: types.Message, state: FSMContext):
 
     data = await state.get_data()
     project_id = data.get("project_id")
-    async with httpx.AsyncClient() as client:
-        url = f"{WEB_API_URL}/api/projects/{project_id}/schedule"
-        r = await client.post(url, json=payload)
-        if r.status_code == 200:
-            await message.answer("The request is scheduled.")
-        else:
-            await message.answer(f"Error planning query: {r.status_code} {r.text}")
+    try:
+        await get_backend().schedule(project_id, payload)
+        await message.answer("The request is scheduled.")
+    except ServiceError as e:
+        await message.answer(f"Error planning query: {e.status_code} {e.detail}")
     await state.clear()
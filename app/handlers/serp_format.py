@@ -0,0 +1,17 @@
+TELEGRAM_MESSAGE_LIMIT = 4000
+
+
+def organic_result_messages(organic: list, header: str) -> list:
+    # Splits the full position list into messages that fit Telegram's size limit.
+    messages = []
+    text = header
+    for idx, item in enumerate(organic, start=1):
+        position = item.get("position", idx)
+        entry = f"{position}. {item.get('title', '')}\n{item.get('link', '')}\n\n"
+        if len(text) + len(entry) > TELEGRAM_MESSAGE_LIMIT:
+            messages.append(text)
+            text = ""
+        text += entry
+    if text:
+        messages.append(text)
+    return messages
@@ -5,6 +5,7 @@ class OneTimeSearchStates(StatesGroup):
     waiting_for_country = State()
     waiting_for_language = State()
     waiting_for_domain = State()
+    waiting_for_depth = State()
     show_actions = State()
 
 class ProjectSearchStates(StatesGroup):
@@ -12,6 +13,7 @@ class ProjectSearchStates(StatesGroup):
     waiting_for_country = State()
     waiting_for_language = State()
     waiting_for_domain = State()
+    waiting_for_depth = State()
     show_actions = State()
 
 class GoMenuStates(StatesGroup):
@@ -3,6 +3,7 @@ from fastapi import FastAPI
 from api.routes import auth_router, telegram_router, scheduler_router
 from api.user_routes import router as user_router
 from api.project_routes import router as project_router
+from api.metrics_routes import router as metrics_router
 
 app = FastAPI(
     title="My Application API (Celery + SQLA Beat)",
@@ -19,6 +20,8 @@ app.include_router(user_router, prefix="/api", tags=["Users"])
 
 app.include_router(project_router, prefix="/api", tags=["Projects"])
 
+app.include_router(metrics_router, prefix="/metrics", tags=["Metrics"])
+
 @app.get("/")
 async def healthcheck():
     return {"status": "ok"}
@@ -1,5 +1,6 @@
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
 import asyncio
 import os
 
@@ -8,18 +9,40 @@ from app.handlers.go_menu import router as go_menu_router
 from app.handlers.project import router as project_router
 from app.handlers.start_stop import router as start_stop_router
 
-API_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+from app.bot_webhook import serve_webhook
+from services.redis_client import REDIS_URL
+from services.telegram_client import create_bot
+from app.api_client import close_api_client
+
+# "polling" runs one long-poll loop; "webhook" serves updates over HTTP and can run as several replicas.
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# "redis" lets several bot replicas share FSM state; "memory" is for local single-process runs.
+BOT_FSM_STORAGE = os.getenv("BOT_FSM_STORAGE", "redis")
+BOT_FSM_TTL = int(os.getenv("BOT_FSM_TTL", "86400"))
+
+
+def create_storage():
+    if BOT_FSM_STORAGE == "redis":
+        return RedisStorage.from_url(REDIS_URL, state_ttl=BOT_FSM_TTL, data_ttl=BOT_FSM_TTL)
+    return MemoryStorage()
+
 
 async def main():
-    bot = Bot(token=API_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    bot = create_bot()
+    dp = Dispatcher(storage=create_storage())
 
     dp.include_router(onetime_router)
     dp.include_router(go_menu_router)
     dp.include_router(project_router)
     dp.include_router(start_stop_router)
 
-    await dp.start_polling(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await serve_webhook(bot, dp)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await close_api_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,10 +1,166 @@
 import os
-import requests
+import time
+import asyncio
+import hashlib
+import logging
+
+import httpx
 from fastapi import HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, JWTError, ExpiredSignatureError
+
+from services.cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
 
 KEYCLOAK_URL = os.getenv("KEYCLOAK_URL", "http://keycloak:8080/auth")
 REALM_NAME = os.getenv("REALM_NAME", "master")
+# "jwks" verifies tokens locally; "userinfo" asks Keycloak about every (uncached) token.
+KEYCLOAK_VERIFY_MODE = os.getenv("KEYCLOAK_VERIFY_MODE", "jwks")
+# Empty disables the check, e.g. when tokens are issued under a public hostname the API does not know.
+KEYCLOAK_ISSUER = os.getenv("KEYCLOAK_ISSUER", "")
+KEYCLOAK_AUDIENCE = os.getenv("KEYCLOAK_AUDIENCE", "")
+KEYCLOAK_ALGORITHMS = os.getenv("KEYCLOAK_ALGORITHMS", "RS256").split(",")
+KEYCLOAK_USERINFO_FALLBACK = os.getenv("KEYCLOAK_USERINFO_FALLBACK", "true").lower() == "true"
+KEYCLOAK_TIMEOUT = float(os.getenv("KEYCLOAK_TIMEOUT", "5"))
+JWKS_TTL = float(os.getenv("JWKS_TTL", "3600"))
+# An unknown kid triggers a refresh (key rotation), but not more often than this.
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+USERINFO_CACHE_TTL = float(os.getenv("USERINFO_CACHE_TTL", "60"))
+
+REALM_URL = f"{KEYCLOAK_URL}/realms/{REALM_NAME}"
+JWKS_URL = f"{REALM_URL}/protocol/openid-connect/certs"
+USERINFO_URL = f"{REALM_URL}/protocol/openid-connect/userinfo"
+
+auth_counters = {"cache_hits": 0, "verified": 0, "rejected": 0, "userinfo": 0, "jwks_refreshes": 0}
+
+_client = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=KEYCLOAK_TIMEOUT)
+    return _client
+
+
+class KeycloakUnavailable(Exception):
+    pass
+
+
+class JwksCache:
+    # Realm signing keys by kid. Refreshed when older than JWKS_TTL, or when a token names a kid
+    # we do not have yet; concurrent refreshes are collapsed into one request.
+
+    def __init__(self, url: str):
+        self.url = url
+        self.keys = {}
+        self.fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self):
+        try:
+            resp = await _get_client().get(self.url)
+            resp.raise_for_status()
+            keys = resp.json()["keys"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            raise KeycloakUnavailable(f"JWKS fetch failed: {e}")
+        self.keys = {key["kid"]: key for key in keys if key.get("use", "sig") == "sig"}
+        self.fetched_at = time.monotonic()
+        auth_counters["jwks_refreshes"] += 1
+        logger.info(f"JWKS refreshed, {len(self.keys)} signing keys")
+
+    async def get_key(self, kid: str):
+        fetched_at = self.fetched_at
+        age = time.monotonic() - fetched_at
+        if kid in self.keys and age < JWKS_TTL:
+            return self.keys[kid]
+        if kid not in self.keys and self.keys and age < JWKS_MIN_REFRESH_INTERVAL:
+            return None
+        async with self._lock:
+            # Skip if another request refreshed while we waited for the lock.
+            if self.fetched_at == fetched_at:
+                try:
+                    await self._refresh()
+                except KeycloakUnavailable:
+                    if kid not in self.keys:
+                        raise
+                    logger.warning("JWKS refresh failed, keeping the cached keys")
+                    self.fetched_at = time.monotonic() - JWKS_TTL + JWKS_MIN_REFRESH_INTERVAL
+        return self.keys.get(kid)
+
+
+jwks_cache = JwksCache(JWKS_URL)
+# sha256(token) -> claims, kept until the token expires.
+claims_cache = LRUTTLCache(AUTH_CACHE_SIZE, JWKS_TTL)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def verify_token(token: str) -> dict:
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    key = await jwks_cache.get_key(header.get("kid"))
+    if key is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=KEYCLOAK_ALGORITHMS,
+            audience=KEYCLOAK_AUDIENCE or None,
+            issuer=KEYCLOAK_ISSUER or None,
+            options={"verify_aud": bool(KEYCLOAK_AUDIENCE)},
+        )
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+async def fetch_userinfo(token: str) -> dict:
+    auth_counters["userinfo"] += 1
+    try:
+        resp = await _get_client().get(USERINFO_URL, headers={"Authorization": f"Bearer {token}"})
+    except httpx.HTTPError:
+        raise HTTPException(status_code=503, detail="Keycloak not available")
+    if resp.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return resp.json()
+
+
+async def authenticate(token: str) -> dict:
+    cache_key = _token_key(token)
+    claims = claims_cache.get(cache_key)
+    if claims is not None:
+        auth_counters["cache_hits"] += 1
+        return claims
+
+    try:
+        if KEYCLOAK_VERIFY_MODE == "userinfo":
+            claims, ttl = await fetch_userinfo(token), USERINFO_CACHE_TTL
+        else:
+            try:
+                claims = await verify_token(token)
+                ttl = claims.get("exp", 0) - time.time()
+                auth_counters["verified"] += 1
+            except KeycloakUnavailable as e:
+                if not KEYCLOAK_USERINFO_FALLBACK:
+                    raise HTTPException(status_code=503, detail="Keycloak not available")
+                logger.warning(f"Falling back to userinfo: {e}")
+                claims, ttl = await fetch_userinfo(token), USERINFO_CACHE_TTL
+    except HTTPException:
+        auth_counters["rejected"] += 1
+        raise
+
+    if ttl > 0:
+        claims_cache.set(cache_key, claims, ttl)
+    return claims
 
 
 class KeycloakBearerAuth(HTTPBearer):
@@ -13,20 +169,5 @@ class KeycloakBearerAuth(HTTPBearer):
         if credentials.scheme.lower() != "bearer":
             raise HTTPException(status_code=403, detail="Invalid auth. Bearer token required.")
 
-        token = credentials.credentials
-        userinfo_url = f"{KEYCLOAK_URL}/realms/{REALM_NAME}/protocol/openid-connect/userinfo"
-        try:
-            resp = requests.get(
-                userinfo_url,
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=5
-            )
-            if resp.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid token")
-
-            user_info = resp.json()
-            request.state.user = user_info
-        except requests.RequestException:
-            raise HTTPException(status_code=503, detail="Keycloak not available")
-
+        request.state.user = await authenticate(credentials.credentials)
         return credentials
@@ -0,0 +1,5 @@
+DEPTHS = [
+    ("Top 10", "10"),
+    ("Top 50", "50"),
+    ("Top 100", "100")
+]
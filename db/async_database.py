@@ -0,0 +1,33 @@
+import os
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from db.database import DATABASE_URL
+
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+
+
+def _async_url(url: str) -> str:
+    # Same database as DATABASE_URL, reached through asyncpg instead of psycopg2.
+    if url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url[len("postgresql+psycopg2://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
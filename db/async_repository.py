@@ -0,0 +1,193 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy_celery_beat.models import (
+    PeriodicTask,
+    IntervalSchedule,
+    CrontabSchedule,
+    PeriodicTaskChanged,
+)
+
+from db.models.telegram_user import TelegramUser
+
+logger = logging.getLogger(__name__)
+
+# Async counterpart of db/repository.py for the API; Celery tasks keep using the sync one.
+# celery-beat columns are timestamptz, and asyncpg only accepts aware datetimes for them.
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def find_telegram_user(db: AsyncSession, chat_id: str):
+    return (await db.execute(select(TelegramUser).filter_by(chat_id=chat_id))).scalar_one_or_none()
+
+
+async def create_telegram_user(data: dict, db: AsyncSession):
+    user = await find_telegram_user(db, data["chat_id"])
+    if not user:
+        user = TelegramUser(**data)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+    return user
+
+
+async def get_all_telegram_users(db: AsyncSession):
+    return (await db.execute(select(TelegramUser))).scalars().all()
+
+
+async def update_telegram_user(chat_id: str, updates: dict, db: AsyncSession):
+    user = await find_telegram_user(db, chat_id)
+    if not user:
+        return None
+    for key, value in updates.items():
+        if value is None:
+            continue
+        setattr(user, key, value)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def _get_or_create_schedule(db: AsyncSession, schedule_type: str, interval_seconds: int = None,
+                                  schedule_value: dict = None):
+    if schedule_type == "interval":
+        if interval_seconds is None:
+            raise ValueError("interval_seconds is required for interval schedule")
+        schedule_obj = (await db.execute(
+            select(IntervalSchedule).filter_by(every=interval_seconds, period="seconds").limit(1)
+        )).scalar_one_or_none()
+        if not schedule_obj:
+            schedule_obj = IntervalSchedule(every=interval_seconds, period="seconds")
+    elif schedule_type == "crontab":
+        if not schedule_value:
+            raise ValueError("schedule_value is required for crontab schedule")
+        fields = dict(
+            minute=schedule_value.get("minute", "0"),
+            hour=schedule_value.get("hour", "0"),
+            day_of_week=schedule_value.get("day_of_week", "0"),
+            day_of_month=schedule_value.get("day_of_month", "*"),
+            month_of_year=schedule_value.get("month_of_year", "*"),
+            timezone=schedule_value.get("timezone", "UTC")
+        )
+        schedule_obj = (await db.execute(
+            select(CrontabSchedule).filter_by(**fields).limit(1)
+        )).scalar_one_or_none()
+        if not schedule_obj:
+            schedule_obj = CrontabSchedule(**fields)
+    else:
+        raise ValueError("Unsupported schedule type")
+
+    if schedule_obj.id is None:
+        db.add(schedule_obj)
+        await db.commit()
+        await db.refresh(schedule_obj)
+    return schedule_obj
+
+
+async def create_or_update_periodic_task(db: AsyncSession, chat_id: str, text: str, interval_seconds: int = None,
+                                         schedule_type: str = "interval", schedule_value: dict = None):
+    schedule_obj = await _get_or_create_schedule(db, schedule_type, interval_seconds, schedule_value)
+
+    name = f"periodic_{chat_id}"
+    periodic_task = (await db.execute(select(PeriodicTask).filter_by(name=name))).scalar_one_or_none()
+    if not periodic_task:
+        periodic_task = PeriodicTask(
+            name=name,
+            task="managers.telegram_manager.send_message_task",
+            one_off=False,
+            enabled=True,
+        )
+        db.add(periodic_task)
+
+    periodic_task.schedule_model = schedule_obj
+    periodic_task.kwargs = json.dumps({"chat_id": chat_id, "message_text": text})
+    periodic_task.enabled = True
+    periodic_task.start_time = _now()
+
+    await db.commit()
+    await db.refresh(periodic_task)
+    return periodic_task
+
+
+async def mark_schedule_changed(db: AsyncSession):
+    # Makes celery-beat's DatabaseScheduler reload its schedule on the next tick.
+    change_record = await db.get(PeriodicTaskChanged, 1)
+    if not change_record:
+        db.add(PeriodicTaskChanged(id=1, last_update=_now()))
+    else:
+        change_record.last_update = _now()
+    await db.commit()
+
+
+async def disable_periodic_task(db: AsyncSession, chat_id: str):
+    name = f"periodic_{chat_id}"
+    task = (await db.execute(select(PeriodicTask).filter_by(name=name))).scalar_one_or_none()
+    if not task:
+        logger.warning(f"Task {name} not found")
+        return False
+
+    logger.info(f"Task disable {name}")
+    task.enabled = False
+    await db.commit()
+    await mark_schedule_changed(db)
+    return True
+
+
+async def list_periodic_tasks(db: AsyncSession):
+    return (await db.execute(select(PeriodicTask))).scalars().all()
+
+
+async def update_periodic_task(db: AsyncSession, task_id: int, interval_seconds: int = None, text: str = None,
+                               schedule_type: str = "interval", schedule_value: dict = None):
+    task = await db.get(PeriodicTask, task_id)
+    if not task:
+        return None
+    schedule_obj = await _get_or_create_schedule(db, schedule_type, interval_seconds, schedule_value)
+
+    task.schedule_model = schedule_obj
+    old_data = {}
+    if task.kwargs:
+        try:
+            old_data = json.loads(task.kwargs)
+        except ValueError:
+            pass
+    if text is not None:
+        old_data.update({"message_text": text})
+    task.kwargs = json.dumps(old_data)
+    task.enabled = True
+    await db.commit()
+    await db.refresh(task)
+    return task
+
+
+async def _delete_task(db: AsyncSession, task) -> bool:
+    if not task:
+        return False
+    schedule_id = task.schedule_id
+    await db.delete(task)
+    await db.commit()
+    remaining_tasks = await db.scalar(
+        select(func.count()).select_from(PeriodicTask).filter_by(schedule_id=schedule_id)
+    )
+    if remaining_tasks == 0:
+        schedule_obj = await db.get(IntervalSchedule, schedule_id) or await db.get(CrontabSchedule, schedule_id)
+        if schedule_obj:
+            await db.delete(schedule_obj)
+            await db.commit()
+    return True
+
+
+async def delete_periodic_task_by_chat_id(db: AsyncSession, chat_id: str):
+    name = f"periodic_{chat_id}"
+    task = (await db.execute(select(PeriodicTask).filter_by(name=name))).scalar_one_or_none()
+    return await _delete_task(db, task)
+
+
+async def delete_periodic_task_by_id(db: AsyncSession, task_id: int):
+    return await _delete_task(db, await db.get(PeriodicTask, task_id))
@@ -1,6 +1,8 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, DateTime
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.sql.expression import FunctionElement
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +20,23 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+class utcnow(FunctionElement):
+    # The database's current time in UTC as a naive timestamp, whatever the session time zone.
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw):
+    return "timezone('utc', now())"
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC.
+    return "CURRENT_TIMESTAMP"
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -2,10 +2,15 @@ from db.models.telegram_user import TelegramUser
 from db.models.project import Project
 from db.models.project_member import ProjectMember
 from db.models.search_history import SearchHistory
+from db.models.serp_result_item import SerpResultItem
+from db.models.rank_daily import RankDaily, QueryDaily
 
 __all__ = [
     "TelegramUser",
     "Project",
     "ProjectMember",
     "SearchHistory",
+    "SerpResultItem",
+    "RankDaily",
+    "QueryDaily",
 ]
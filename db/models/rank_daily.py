@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, PrimaryKeyConstraint
+from db.database import Base
+
+class RankDaily(Base):
+    # Per project, day, query and domain: best position and the sum/count for the average,
+    # upserted as results are stored (see db/rank_aggregates.py).
+    __tablename__ = "rank_daily"
+    __table_args__ = (
+        PrimaryKeyConstraint("project_id", "domain", "day", "query_text"),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    domain = Column(String(255), nullable=False)
+    day = Column(Date, nullable=False)
+    query_text = Column(String(500), nullable=False)
+    best_position = Column(Integer, nullable=False)
+    position_sum = Column(Integer, nullable=False)
+    samples = Column(Integer, nullable=False)
+
+
+class QueryDaily(Base):
+    # How often each query ran per day; the denominator of the visibility score.
+    __tablename__ = "query_daily"
+    __table_args__ = (
+        PrimaryKeyConstraint("project_id", "day", "query_text"),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    query_text = Column(String(500), nullable=False)
+    runs = Column(Integer, nullable=False)
@@ -1,16 +1,38 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, LargeBinary, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from db.database import Base
+from db.database import Base, utcnow
+from db.results_codec import decode_results_text, decode_results
 
 class SearchHistory(Base):
     __tablename__ = "search_history"
+    __table_args__ = (
+        Index("ix_search_history_project_created_id", "project_id", "created_at", "id"),
+    )
+    # created_at is read back in the INSERT, so ingest buckets aggregates by the stored value.
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("telegram_users.id"), nullable=False)
     query_text = Column(String(500), nullable=False)
+    # The payload lives in exactly one of these, see db/results_codec.py; results_json is the legacy format.
     results_json = Column(Text, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    results_blob = Column(LargeBinary, nullable=True)
+    results_jsonb = Column(JSONB().with_variant(JSON(), "sqlite"), nullable=True)
+    # Only the database sets it, in UTC: history pages, exports and the rank aggregates all read this value.
+    created_at = Column(DateTime, server_default=utcnow())
 
     project = relationship("Project")
     user = relationship("TelegramUser")
+
+    # Selected together by readers that load rows column by column.
+    @classmethod
+    def results_columns(cls):
+        return cls.results_blob, cls.results_jsonb, cls.results_json
+
+    def results_text(self) -> str:
+        return decode_results_text(self.results_blob, self.results_jsonb, self.results_json)
+
+    def results(self) -> dict:
+        return decode_results(self.results_blob, self.results_jsonb, self.results_json)
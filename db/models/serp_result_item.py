@@ -0,0 +1,46 @@
+from urllib.parse import urlparse
+
+from sqlalchemy import Column, BigInteger, Integer, String, Text, ForeignKey, Index
+from db.database import Base
+
+
+def normalize_domain(host: str) -> str:
+    host = host.strip().lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class SerpResultItem(Base):
+    # One organic result of a stored search, written next to its SearchHistory row
+    # so rank questions are answered by indexed SQL instead of decoding payloads.
+    __tablename__ = "serp_result_items"
+    __table_args__ = (
+        Index("ix_serp_result_items_project_domain", "project_id", "domain"),
+        Index("ix_serp_result_items_history_id", "history_id"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    history_id = Column(Integer, ForeignKey("search_history.id", ondelete="CASCADE"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    url = Column(Text, nullable=False)
+    domain = Column(String(255), nullable=False)
+    title = Column(Text, nullable=True)
+
+    @staticmethod
+    def rows_from_results(history_id: int, project_id: int, results: dict) -> list:
+        # Plain dicts for a bulk insert(SerpResultItem) executemany.
+        rows = []
+        for idx, item in enumerate(results.get("organic") or [], start=1):
+            url = item.get("link")
+            if not url:
+                continue
+            domain = normalize_domain(urlparse(url).netloc)
+            rows.append({
+                "history_id": history_id,
+                "project_id": project_id,
+                "position": item.get("position") or idx,
+                "url": url,
+                "domain": domain[:255],
+                "title": item.get("title"),
+            })
+        return rows
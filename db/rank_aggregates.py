@@ -0,0 +1,99 @@
+from datetime import date
+
+from sqlalchemy import insert, delete, select, case, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db.models.search_history import SearchHistory
+from db.models.serp_result_item import SerpResultItem
+from db.models.rank_daily import RankDaily, QueryDaily
+
+# Share of clicks by organic position, used to weight visibility; positions past 10 count as 0.
+CTR_BY_POSITION = {1: 0.28, 2: 0.15, 3: 0.11, 4: 0.08, 5: 0.07, 6: 0.05, 7: 0.04, 8: 0.03, 9: 0.03, 10: 0.02}
+
+
+def _upsert(dialect_name: str):
+    return sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+
+
+def ctr_weight(position_column):
+    return case(*[(position_column == pos, ctr) for pos, ctr in CTR_BY_POSITION.items()], else_=0.0)
+
+
+def ingest_statements(dialect_name: str, history_id: int, project_id: int, query_text: str, results: dict,
+                      day: date = None) -> list:
+    # (statement, params) pairs that store one search's result items and, when day is given,
+    # fold it into the daily aggregates with ON CONFLICT upserts. Run them in the transaction
+    # that writes the SearchHistory row; day must be the date of its created_at, as in the rebuild.
+    rows = SerpResultItem.rows_from_results(history_id, project_id, results)
+    statements = []
+    if rows:
+        statements.append((insert(SerpResultItem), rows))
+    if day is None:
+        return statements
+
+    upsert = _upsert(dialect_name)
+    best = {}
+    for row in rows:
+        best[row["domain"]] = min(row["position"], best.get(row["domain"], row["position"]))
+    if best:
+        stmt = upsert(RankDaily)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["project_id", "domain", "day", "query_text"],
+            set_={
+                "best_position": case(
+                    (stmt.excluded.best_position < RankDaily.best_position, stmt.excluded.best_position),
+                    else_=RankDaily.best_position,
+                ),
+                "position_sum": RankDaily.position_sum + stmt.excluded.position_sum,
+                "samples": RankDaily.samples + 1,
+            },
+        )
+        statements.append((stmt, [
+            {"project_id": project_id, "domain": domain, "day": day, "query_text": query_text,
+             "best_position": position, "position_sum": position, "samples": 1}
+            for domain, position in best.items()
+        ]))
+
+    stmt = upsert(QueryDaily)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["project_id", "day", "query_text"],
+        set_={"runs": QueryDaily.runs + 1},
+    )
+    statements.append((stmt, {"project_id": project_id, "day": day, "query_text": query_text, "runs": 1}))
+    return statements
+
+
+def rebuild_statements(project_id: int = None) -> list:
+    # Recomputes the aggregates from serp_result_items and search_history entirely in SQL,
+    # for history stored before the aggregates existed. A search's day is the date of its
+    # created_at, which the database stores in UTC, so a rebuild reproduces the incremental buckets.
+    day = func.date(SearchHistory.created_at)
+    per_search = (
+        select(
+            SearchHistory.project_id, day.label("day"), SearchHistory.query_text, SerpResultItem.domain,
+            func.min(SerpResultItem.position).label("position"),
+        )
+        .join(SerpResultItem, SerpResultItem.history_id == SearchHistory.id)
+        .group_by(SearchHistory.id, SearchHistory.project_id, day, SearchHistory.query_text, SerpResultItem.domain)
+    )
+    runs = select(SearchHistory.project_id, day, SearchHistory.query_text, func.count()) \
+        .group_by(SearchHistory.project_id, day, SearchHistory.query_text)
+    clear_rank, clear_query = delete(RankDaily), delete(QueryDaily)
+    if project_id is not None:
+        per_search = per_search.where(SearchHistory.project_id == project_id)
+        runs = runs.where(SearchHistory.project_id == project_id)
+        clear_rank = clear_rank.where(RankDaily.project_id == project_id)
+        clear_query = clear_query.where(QueryDaily.project_id == project_id)
+    per_search = per_search.subquery()
+    ranks = select(
+        per_search.c.project_id, per_search.c.domain, per_search.c.day, per_search.c.query_text,
+        func.min(per_search.c.position), func.sum(per_search.c.position), func.count(),
+    ).group_by(per_search.c.project_id, per_search.c.domain, per_search.c.day, per_search.c.query_text)
+    return [
+        clear_rank,
+        clear_query,
+        insert(RankDaily).from_select(
+            ["project_id", "domain", "day", "query_text", "best_position", "position_sum", "samples"], ranks
+        ),
+        insert(QueryDaily).from_select(["project_id", "day", "query_text", "runs"], runs),
+    ]
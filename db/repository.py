@@ -4,6 +4,9 @@ from datetime import datetime
 import logging
 
 from db.models.telegram_user import TelegramUser
+from db.models.search_history import SearchHistory
+from db.rank_aggregates import ingest_statements
+from db.results_codec import encode_results
 from sqlalchemy_celery_beat.models import (
     PeriodicTask,
     IntervalSchedule,
@@ -42,6 +45,34 @@ def update_telegram_user(chat_id: str, updates: dict, db: Session):
     return user
 
 
+def add_search_history_entries(db: Session, project_id: int, user_id: int, rows: list) -> list:
+    # The single ingest path for search results; async callers go through AsyncSession.run_sync.
+    # Each row is {"query", "results"} and/or {"results_json"}, so neither form is built twice.
+    # Stores the history rows, their serp_result_items and the daily aggregates in the caller's
+    # transaction and returns the new ids; the caller commits.
+    # A search's day is the date of the created_at the database stored for it, the same value
+    # rebuild_statements groups by, so the incremental and rebuilt buckets always agree.
+    entries = [
+        SearchHistory(
+            project_id=project_id,
+            user_id=user_id,
+            query_text=row["query"],
+            **encode_results(row.get("results_json") or json.dumps(row["results"]))
+        )
+        for row in rows
+    ]
+    db.add_all(entries)
+    db.flush()
+    for entry, row in zip(entries, rows):
+        results = row.get("results")
+        if results is None:
+            results = json.loads(row["results_json"])
+        for stmt, params in ingest_statements(db.get_bind().dialect.name, entry.id, project_id, row["query"],
+                                              results, entry.created_at.date()):
+            db.execute(stmt, params)
+    return [entry.id for entry in entries]
+
+
 def create_or_update_periodic_task(db: Session, chat_id: str, text: str, interval_seconds: int = None,
                                    schedule_type: str = "interval", schedule_value: dict = None):
     if schedule_type == "interval":
@@ -0,0 +1,82 @@
+import os
+import json
+import zlib
+import logging
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for RESULTS_CODEC=zstd
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# How new SearchHistory payloads are stored:
+#   zlib / zstd - compressed JSON bytes in results_blob
+#   jsonb       - Postgres JSONB in results_jsonb
+#   text        - plain JSON text in results_json (the original format)
+# Readers accept every format regardless of this setting, so it can be changed at any time.
+RESULTS_CODEC = os.getenv("RESULTS_CODEC", "zlib")
+RESULTS_ZLIB_LEVEL = int(os.getenv("RESULTS_ZLIB_LEVEL", "6"))
+RESULTS_ZSTD_LEVEL = int(os.getenv("RESULTS_ZSTD_LEVEL", "3"))
+
+# First byte of results_blob names the compressor.
+_ZLIB = b"z"
+_ZSTD = b"s"
+
+if RESULTS_CODEC == "zstd" and zstandard is None:
+    logger.warning("RESULTS_CODEC=zstd but zstandard is not installed, using zlib")
+    RESULTS_CODEC = "zlib"
+
+
+def _compress(text: str) -> bytes:
+    data = text.encode()
+    if RESULTS_CODEC == "zstd":
+        return _ZSTD + zstandard.ZstdCompressor(level=RESULTS_ZSTD_LEVEL).compress(data)
+    return _ZLIB + zlib.compress(data, RESULTS_ZLIB_LEVEL)
+
+
+class ResultsDecodeError(ValueError):
+    # A ValueError like a JSON parse failure, so readers skip unreadable rows with one except clause.
+    pass
+
+
+def _decompress(blob: bytes) -> str:
+    tag, data = blob[:1], blob[1:]
+    if tag == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("results_blob is zstd-compressed but zstandard is not installed")
+        try:
+            return zstandard.ZstdDecompressor().decompress(data).decode()
+        except zstandard.ZstdError as e:
+            raise ResultsDecodeError(f"corrupt zstd results_blob: {e}") from e
+    try:
+        return zlib.decompress(data).decode()
+    except zlib.error as e:
+        raise ResultsDecodeError(f"corrupt zlib results_blob: {e}") from e
+
+
+def encode_results(results_json: str) -> dict:
+    # Column values for a SearchHistory row, e.g. SearchHistory(..., **encode_results(text)).
+    if results_json is None:
+        return {"results_blob": None, "results_jsonb": None, "results_json": None}
+    if RESULTS_CODEC == "jsonb":
+        return {"results_blob": None, "results_jsonb": json.loads(results_json), "results_json": None}
+    if RESULTS_CODEC == "text":
+        return {"results_blob": None, "results_jsonb": None, "results_json": results_json}
+    return {"results_blob": _compress(results_json), "results_jsonb": None, "results_json": None}
+
+
+def decode_results_text(blob: bytes = None, jsonb=None, text: str = None) -> str:
+    # JSON text of a row in any storage format, for callers that pass it through unparsed.
+    if blob is not None:
+        return _decompress(bytes(blob))
+    if jsonb is not None:
+        return json.dumps(jsonb)
+    return text or "{}"
+
+
+def decode_results(blob: bytes = None, jsonb=None, text: str = None) -> dict:
+    # Parsed payload of a row in any storage format; JSONB rows come back already parsed.
+    if jsonb is not None and blob is None:
+        return jsonb
+    return json.loads(decode_results_text(blob, jsonb, text))
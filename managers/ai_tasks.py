@@ -0,0 +1,94 @@
+import os
+import logging
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from datetime import date
+
+from app.celery_app import celery_app
+from db.database import SessionLocal
+from services.openai_service import stream_analysis
+from services.project_summary import load_history_digests, summarize_digests
+from services.telegram_stream import render_stream, as_chunks
+from services.telegram_client import get_worker_loop, get_worker_bot
+
+logger = logging.getLogger(__name__)
+
+AI_TASK_SOFT_TIME_LIMIT = int(os.getenv("AI_TASK_SOFT_TIME_LIMIT", "180"))
+AI_SUMMARY_SOFT_TIME_LIMIT = int(os.getenv("AI_SUMMARY_SOFT_TIME_LIMIT", "900"))
+
+def actions_markup(actions: list):
+    if not actions:
+        return None
+    builder = InlineKeyboardBuilder()
+    for text, callback_data in actions:
+        builder.add(InlineKeyboardButton(text=text, callback_data=callback_data))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+async def deliver_analysis(bot: Bot, chat_id: int, chunks, actions: list = None,
+                           header: str = "Analyze result:\n") -> str:
+    text = await render_stream(bot, chat_id, chunks, header=header)
+    if actions:
+        await bot.send_message(chat_id, "Action:", reply_markup=actions_markup(actions))
+    return text
+
+
+@celery_app.task(name="managers.ai_tasks.analyze_results_task", soft_time_limit=AI_TASK_SOFT_TIME_LIMIT)
+def analyze_results_task(chat_id: int, search_results: dict, actions: list = None):
+    logger.info(f"[Celery AI] Analyze results for chat_id={chat_id}")
+    bot = get_worker_bot()
+
+    async def _analyze():
+        try:
+            await deliver_analysis(bot, chat_id, stream_analysis(search_results), actions)
+        except Exception as e:
+            logger.error(f"AI analysis failed for chat_id={chat_id}: {e}")
+            await bot.send_message(chat_id, f"Mistake API openAI: {e}")
+
+    get_worker_loop().run_until_complete(_analyze())
+
+
+def _load_digests(project_id: int, date_from: str = None, date_to: str = None) -> list:
+    db = SessionLocal()
+    try:
+        return load_history_digests(
+            db, project_id,
+            date.fromisoformat(date_from) if date_from else None,
+            date.fromisoformat(date_to) if date_to else None,
+        )
+    finally:
+        db.close()
+
+
+@celery_app.task(name="managers.ai_tasks.summarize_project_task", soft_time_limit=AI_SUMMARY_SOFT_TIME_LIMIT)
+def summarize_project_task(chat_id: int, project_id: int, date_from: str = None, date_to: str = None):
+    logger.info(f"[Celery AI] Summarize project_id={project_id} {date_from}..{date_to} for chat_id={chat_id}")
+    bot = get_worker_bot()
+    digests = _load_digests(project_id, date_from, date_to)
+
+    async def _summarize():
+        try:
+            if not digests:
+                await bot.send_message(chat_id, "History empty for this period.")
+                return
+            summary = await summarize_digests(digests)
+            header = f"Project summary ({summary['rows']} searches):\n"
+            await render_stream(bot, chat_id, as_chunks(summary["report"]), header=header)
+        except Exception as e:
+            logger.error(f"Project summary failed for project_id={project_id}: {e}")
+            await bot.send_message(chat_id, f"Mistake API openAI: {e}")
+
+    get_worker_loop().run_until_complete(_summarize())
+
+
+@celery_app.task(name="managers.ai_tasks.project_summary_task", soft_time_limit=AI_SUMMARY_SOFT_TIME_LIMIT)
+def project_summary_task(project_id: int, date_from: str = None, date_to: str = None) -> dict:
+    # API variant: the report goes to the result backend, where GET .../summary/{task_id} reads it.
+    logger.info(f"[Celery AI] Summarize project_id={project_id} {date_from}..{date_to} for the API")
+    digests = _load_digests(project_id, date_from, date_to)
+    summary = get_worker_loop().run_until_complete(summarize_digests(digests))
+    return {"project_id": project_id, **summary}
@@ -1,31 +1,50 @@
-import json
+import os
 import logging
+from sqlalchemy import exists
 from db.database import SessionLocal
 from db.models.search_history import SearchHistory
-from services.serper_service import google_search
+from db.models.serp_result_item import SerpResultItem
+from db.rank_aggregates import ingest_statements, rebuild_statements
+from db.results_codec import decode_results
+from db import repository
+from services.serper_service import google_search, google_search_batch, UPSTREAM_ERRORS
+from services.deep_search import deep_search, SERP_PAGE_SIZE
 from app.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
-@celery_app.task(name="managers.project_tasks.scheduled_search_task")
-def scheduled_search_task(project_id: int, user_id: int, query: str, country="US", language="en", domain="google.com"):
+SCHEDULED_SEARCH_MAX_RETRIES = 5
+# Countdown for upstream errors that carry no retry_after of their own.
+SCHEDULED_SEARCH_RETRY_COUNTDOWN = float(os.getenv("SCHEDULED_SEARCH_RETRY_COUNTDOWN", "30"))
+RESULT_ITEMS_BACKFILL_BATCH = int(os.getenv("RESULT_ITEMS_BACKFILL_BATCH", "500"))
+
+@celery_app.task(bind=True, name="managers.project_tasks.scheduled_search_task",
+                 max_retries=SCHEDULED_SEARCH_MAX_RETRIES)
+def scheduled_search_task(self, project_id: int, user_id: int, query: str, country="US", language="en",
+                          domain="google.com", depth=SERP_PAGE_SIZE):
     logger.info(f"[Celery Task] Start task: project_id={project_id}, user_id={user_id}, query='{query}'")
-    results = {}
     try:
-        results = google_search(query, country, language, domain)
+        if depth > SERP_PAGE_SIZE:
+            results = deep_search(query, country, language, domain, depth, policy="scheduled")
+        else:
+            results = google_search(query, country, language, domain, policy="scheduled")
         logger.info("Google search success")
+    except UPSTREAM_ERRORS as e:
+        # A failed run is retried or dropped, never stored: an empty row would count as a run
+        # with no rankings in the daily aggregates.
+        countdown = getattr(e, "retry_after", None) or SCHEDULED_SEARCH_RETRY_COUNTDOWN
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Serper unavailable, retrying in {countdown:.1f}s: {e}")
+            raise self.retry(exc=e, countdown=countdown)
+        logger.error(f"Serper unavailable, giving up after {self.request.retries} retries: {e}")
+        return
     except Exception as e:
         logger.error(f"Error google_search: {e}")
+        raise
 
     db = SessionLocal()
     try:
-        entry = SearchHistory(
-            project_id=project_id,
-            user_id=user_id,
-            query_text=query,
-            results_json=json.dumps(results)
-        )
-        db.add(entry)
+        repository.add_search_history_entries(db, project_id, user_id, [{"query": query, "results": results}])
         db.commit()
         logger.info("[Celery Task] Result saved in SearchHistory.")
     except Exception as e:
@@ -33,3 +52,94 @@ def scheduled_search_task(project_id: int, user_id: int, query: str, country="US
         db.rollback()
     finally:
         db.close()
+
+
+@celery_app.task(name="managers.project_tasks.batch_search_task")
+def batch_search_task(project_id: int, user_id: int, queries: list):
+    logger.info(f"[Celery Task] Start batch task: project_id={project_id}, user_id={user_id}, queries={len(queries)}")
+    queries = [
+        {
+            "query": q["query"],
+            "country": q.get("country", "US"),
+            "language": q.get("language", "en"),
+            "domain": q.get("domain", "google.com"),
+        }
+        for q in queries
+    ]
+    outcomes = google_search_batch(queries, policy="scheduled")
+    rows = [
+        {"query": q["query"], "results": outcome["results"]}
+        for q, outcome in zip(queries, outcomes) if outcome["ok"]
+    ]
+
+    db = SessionLocal()
+    try:
+        repository.add_search_history_entries(db, project_id, user_id, rows)
+        db.commit()
+        logger.info(f"[Celery Task] Batch saved {len(rows)} of {len(queries)} results in SearchHistory.")
+    except Exception as e:
+        logger.error(f"[Celery Task] Error saving batch SearchHistory: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return [
+        {"query": q["query"], "status": "ok" if outcome["ok"] else "error", "error": outcome.get("error")}
+        for q, outcome in zip(queries, outcomes)
+    ]
+
+
+@celery_app.task(name="managers.project_tasks.backfill_result_items_task")
+def backfill_result_items_task(after_id: int = 0, batch_size: int = RESULT_ITEMS_BACKFILL_BATCH):
+    # Fills serp_result_items for history stored before they existed. Each run handles one batch
+    # in one transaction and re-queues itself from the last id, so it is cheap to interrupt and rerun.
+    db = SessionLocal()
+    try:
+        q = db.query(SearchHistory.id, SearchHistory.project_id, *SearchHistory.results_columns()) \
+            .filter(SearchHistory.id > after_id) \
+            .filter(~exists().where(SerpResultItem.history_id == SearchHistory.id)) \
+            .order_by(SearchHistory.id) \
+            .limit(batch_size)
+        history = q.all()
+        items = 0
+        for history_id, project_id, *payload in history:
+            try:
+                results = decode_results(*payload)
+            except ValueError:
+                logger.warning(f"[Celery Task] Skipping unreadable SearchHistory {history_id}")
+                continue
+            # Items only; the daily aggregates are rebuilt in one pass once the backfill is done.
+            for stmt, params in ingest_statements(db.get_bind().dialect.name, history_id, project_id, "", results):
+                db.execute(stmt, params)
+                items += len(params)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if len(history) < batch_size:
+        logger.info(f"[Celery Task] Result items backfill finished at id {history[-1][0] if history else after_id}")
+        rebuild_rank_aggregates_task.delay()
+        return
+    logger.info(f"[Celery Task] Result items backfilled up to id {history[-1][0]} ({items} items)")
+    backfill_result_items_task.delay(history[-1][0], batch_size)
+
+
+@celery_app.task(name="managers.project_tasks.rebuild_rank_aggregates_task")
+def rebuild_rank_aggregates_task(project_id: int = None):
+    # Recomputes rank_daily / query_daily from stored items in one transaction; normally they are
+    # maintained incrementally at ingest and this is only needed after a backfill.
+    db = SessionLocal()
+    try:
+        for stmt in rebuild_statements(project_id):
+            db.execute(stmt)
+        db.commit()
+        logger.info(f"[Celery Task] Rank aggregates rebuilt for project_id={project_id or 'all'}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
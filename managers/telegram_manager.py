@@ -1,11 +1,10 @@
-import os
 import logging
 import json
-import asyncio
 from datetime import datetime
 
 from celery import shared_task
-from aiogram import Bot
+from services.telegram_client import get_worker_loop, get_worker_bot
+from services.telegram_sender import send_queued
 from sqlalchemy.orm import Session
 from db.database import SessionLocal
 from db.models import TelegramUser
@@ -38,20 +37,15 @@ def send_message_task(chat_id: str, message_text: str = "Hello!"):
         db.close()
 
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
+    bot = get_worker_bot()
 
     async def _send():
         try:
-            await bot.send_message(chat_id, message_text)
+            await send_queued(bot, chat_id, message_text)
         except Exception as e:
             logger.error(f"Failed send message to {chat_id}: {e}")
-        finally:
-            await bot.session.close()
 
-    loop.run_until_complete(_send())
-    loop.close()
+    get_worker_loop().run_until_complete(_send())
 
 
 def revoke_tasks_for_chat(current_app, chat_id: str, states: list):
@@ -0,0 +1,42 @@
+import os
+import hashlib
+
+from services.cache import TwoTierCache
+from services.serp_compaction import estimate_tokens
+from services.shared_counters import SharedCounters
+
+# Bump whenever build_messages or the model settings change, so old analyses are not reused.
+AI_PROMPT_VERSION = os.getenv("AI_PROMPT_VERSION", "1")
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "604800"))
+AI_CACHE_L1_SIZE = int(os.getenv("AI_CACHE_L1_SIZE", "256"))
+AI_CACHE_L1_TTL = int(os.getenv("AI_CACHE_L1_TTL", "600"))
+
+analysis_cache = TwoTierCache("ai:analysis", AI_CACHE_L1_SIZE, AI_CACHE_TTL, l1_ttl=AI_CACHE_L1_TTL)
+
+# Shared through Redis: lookups happen in the bot and the ai workers, not in the API serving the metrics.
+analysis_counters = SharedCounters("ai:analysis", ("hits", "misses", "tokens_avoided"))
+
+
+def analysis_key(digest: str, model: str) -> str:
+    # Keyed on the compacted digest, so SERPs that differ only in dropped fields share an entry.
+    raw = f"{AI_PROMPT_VERSION}|{model}|{digest}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def aget_analysis(key: str, digest: str):
+    text = await analysis_cache.aget(key)
+    if text is not None:
+        await analysis_counters.aincr(hits=1, tokens_avoided=estimate_tokens(digest) + estimate_tokens(text))
+    else:
+        await analysis_counters.aincr(misses=1)
+    return text
+
+
+async def analysis_stats() -> dict:
+    counters = await analysis_counters.aread()
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+        "prompt_version": AI_PROMPT_VERSION,
+    }
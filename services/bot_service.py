@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from celery import current_app
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import async_repository
+from db.models.telegram_user import TelegramUser
+from managers.telegram_manager import revoke_tasks_for_chat
+from services.project_service import ServiceError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5
+
+
+async def start_bot(db: AsyncSession, chat_id: str, message_text: str) -> dict:
+    try:
+        user = await async_repository.find_telegram_user(db, chat_id)
+        if user:
+            user.active = True
+        else:
+            user = TelegramUser(chat_id=chat_id, message_text=message_text, interval=DEFAULT_INTERVAL)
+            db.add(user)
+        await db.commit()
+
+        await async_repository.create_or_update_periodic_task(
+            db=db,
+            chat_id=user.chat_id,
+            text=user.message_text,
+            interval_seconds=user.interval,
+            schedule_type="interval",
+            schedule_value={}
+        )
+        await async_repository.mark_schedule_changed(db)
+        # Celery inspect/revoke is blocking broker I/O, keep it off the event loop.
+        await asyncio.to_thread(revoke_tasks_for_chat, current_app, user.chat_id, ["scheduled", "reserved"])
+        return {"status": "Bot started", "chat_id": user.chat_id}
+    except Exception as e:
+        await db.rollback()
+        raise ServiceError(500, f"Unexpected error: {str(e)}")
+
+
+async def stop_bot(db: AsyncSession, chat_id: str) -> dict:
+    logger.info(f"Attempting to stop bot for chat_id: {chat_id}")
+
+    user = await async_repository.find_telegram_user(db, chat_id)
+    if user:
+        user.active = False
+        await db.commit()
+        logger.info(f"User {chat_id} deactivated")
+    else:
+        logger.warning(f"User {chat_id} not found")
+
+    disabled = await async_repository.disable_periodic_task(db, chat_id)
+    if not disabled:
+        logger.warning(f"Periodic task periodic_{chat_id} not found")
+
+    await asyncio.to_thread(revoke_tasks_for_chat, current_app, chat_id, ["scheduled", "active", "reserved"])
+    return {"status": "Bot stopped!", "chat_id": chat_id}
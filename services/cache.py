@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import redis
+
+from services.redis_client import REDIS_URL, get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_RETRY_AFTER = float(os.getenv("CACHE_REDIS_RETRY_AFTER", "30"))
+
+
+class LRUTTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    # In-process LRU in front of Redis. Values must be JSON-serializable.
+    # Entries remember when they were stored so each caller can apply its own max_age;
+    # ttl only bounds how long anything is kept at all.
+    # Redis failures degrade to L1-only for REDIS_RETRY_AFTER seconds instead of failing callers.
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, l1_ttl: float = None, redis_url: str = REDIS_URL):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.l1 = LRUTTLCache(maxsize, min(ttl, l1_ttl) if l1_ttl else ttl)
+        self.counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "sets": 0,
+            "invalidations": 0,
+            "redis_errors": 0,
+        }
+        self._redis_down_until = 0.0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _redis_available(self) -> bool:
+        return bool(self.redis_url) and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception):
+        self.counters["redis_errors"] += 1
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+        logger.warning(f"[cache:{self.namespace}] Redis unavailable, using L1 only: {e}")
+
+    def _get_redis(self):
+        return get_redis(self.redis_url)
+
+    def _get_aredis(self):
+        return get_async_redis(self.redis_url)
+
+    def _fresh(self, envelope, max_age: float = None):
+        if envelope is None:
+            return None
+        if max_age is not None and time.time() - envelope["t"] > max_age:
+            self.counters["stale"] += 1
+            return None
+        return envelope["v"]
+
+    def _from_l1(self, key: str, max_age: float = None):
+        value = self._fresh(self.l1.get(key), max_age)
+        if value is not None:
+            self.counters["l1_hits"] += 1
+        return value
+
+    def _from_l2(self, key: str, raw, max_age: float = None):
+        envelope = json.loads(raw)
+        self.l1.set(key, envelope)
+        value = self._fresh(envelope, max_age)
+        if value is not None:
+            self.counters["l2_hits"] += 1
+        return value
+
+    def get(self, key: str, max_age: float = None):
+        value = self._from_l1(key, max_age)
+        if value is not None:
+            return value
+        if self._redis_available():
+            try:
+                raw = self._get_redis().get(self._key(key))
+                if raw is not None:
+                    value = self._from_l2(key, raw, max_age)
+                    if value is not None:
+                        return value
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        self.counters["misses"] += 1
+        return None
+
+    async def aget(self, key: str, max_age: float = None):
+        value = self._from_l1(key, max_age)
+        if value is not None:
+            return value
+        if self._redis_available():
+            try:
+                raw = await self._get_aredis().get(self._key(key))
+                if raw is not None:
+                    value = self._from_l2(key, raw, max_age)
+                    if value is not None:
+                        return value
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        self.counters["misses"] += 1
+        return None
+
+    def _envelope(self, value, ttl: float = None):
+        ttl = ttl if ttl is not None else self.ttl
+        return {"t": time.time(), "v": value}, ttl
+
+    def set(self, key: str, value, ttl: float = None):
+        envelope, ttl = self._envelope(value, ttl)
+        self.l1.set(key, envelope, min(ttl, self.l1.ttl))
+        self.counters["sets"] += 1
+        if self._redis_available():
+            try:
+                self._get_redis().set(self._key(key), json.dumps(envelope), ex=int(ttl))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    async def aset(self, key: str, value, ttl: float = None):
+        envelope, ttl = self._envelope(value, ttl)
+        self.l1.set(key, envelope, min(ttl, self.l1.ttl))
+        self.counters["sets"] += 1
+        if self._redis_available():
+            try:
+                await self._get_aredis().set(self._key(key), json.dumps(envelope), ex=int(ttl))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self.l1.delete(key)
+        self.counters["invalidations"] += 1
+        if self._redis_available():
+            try:
+                self._get_redis().delete(*(self._key(key) for key in keys))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    def clear(self):
+        self.l1.clear()
+        self.counters["invalidations"] += 1
+        if self._redis_available():
+            try:
+                client = self._get_redis()
+                keys = list(client.scan_iter(match=self._key("*"), count=500))
+                for i in range(0, len(keys), 500):
+                    client.delete(*keys[i:i + 500])
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    def stats(self) -> dict:
+        hits = self.counters["l1_hits"] + self.counters["l2_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "l1_size": len(self.l1),
+            "hit_ratio": round(hits / lookups, 3) if lookups else None,
+        }
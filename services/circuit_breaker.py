@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds,
+    # then lets a limited number of probe calls through (half-open) to decide whether to close again.
+    # A probe that ends without a verdict (throttled, rate-limited locally, cancelled) must hand its
+    # slot back with release(); one that never reports back expires after probe_timeout.
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30, half_open_max_calls: int = 1,
+                 probe_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.probe_timeout = probe_timeout if probe_timeout is not None else reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self.probe_started_at = 0.0
+        self.counters = {"opened": 0, "rejected": 0, "failures": 0, "successes": 0, "probes_expired": 0}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _reject_if_open(self):
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0:
+            self.counters["rejected"] += 1
+            raise CircuitOpenError(self.name, remaining)
+
+    def check(self):
+        # Fails fast while open, without taking a probe slot; callers use it before waiting on a rate limit.
+        with self._lock:
+            if self.state == OPEN:
+                self._reject_if_open()
+
+    def before_call(self):
+        # Returns a token for release(): the half-open generation when the call holds a probe slot, else None.
+        with self._lock:
+            if self.state == OPEN:
+                self._reject_if_open()
+                self.state = HALF_OPEN
+                self.half_open_calls = 0
+                self._generation += 1
+                logger.info(f"[breaker:{self.name}] half-open, probing upstream")
+            if self.state != HALF_OPEN:
+                return None
+            if self.half_open_calls >= self.half_open_max_calls:
+                if time.monotonic() - self.probe_started_at < self.probe_timeout:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(self.name, self.probe_timeout)
+                self.counters["probes_expired"] += 1
+                logger.warning(f"[breaker:{self.name}] probe never reported back, letting another through")
+                self.half_open_calls = 0
+            self.half_open_calls += 1
+            self.probe_started_at = time.monotonic()
+            return self._generation
+
+    def release(self, token):
+        # Frees the probe slot of a call that ended without record_success/record_failure deciding
+        # the state. A no-op once the state has moved on, so it is safe to call on every exit path.
+        if token is None:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN and token == self._generation and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.counters["successes"] += 1
+            self.failures = 0
+            if self.state != CLOSED:
+                logger.info(f"[breaker:{self.name}] closed")
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                    logger.warning(f"[breaker:{self.name}] open after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.counters}
@@ -0,0 +1,151 @@
+import os
+import math
+import asyncio
+import logging
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+
+from services.serper_service import google_search, async_google_search, SERP_PAGE_SIZE, SERP_MAX_DEPTH
+
+logger = logging.getLogger(__name__)
+
+SERPER_DEEP_CONCURRENCY = int(os.getenv("SERPER_DEEP_CONCURRENCY", "5"))
+# Pages are requested in waves this size, so a SERP that ends early costs at most one wave of extra calls.
+SERPER_DEEP_WAVE = int(os.getenv("SERPER_DEEP_WAVE", "2"))
+# Full pages often carry only 8-9 organic results; fewer than this marks the end of the SERP.
+SERP_SHORT_PAGE = int(os.getenv("SERP_SHORT_PAGE", str(SERP_PAGE_SIZE // 2)))
+
+# Organic fields kept in deep results; sitelinks and other bulky fields are dropped.
+ORGANIC_FIELDS = ("title", "link", "snippet", "date")
+
+_executor = ThreadPoolExecutor(max_workers=SERPER_DEEP_CONCURRENCY, thread_name_prefix="serper-deep")
+
+
+def page_count(depth: int) -> int:
+    depth = max(SERP_PAGE_SIZE, min(depth, SERP_MAX_DEPTH))
+    return math.ceil(depth / SERP_PAGE_SIZE)
+
+
+class DeepMerger:
+    # Turns pages (fed in page order) into one absolute, de-duplicated position sequence.
+    # Each page can be dropped by the caller as soon as feed() returns.
+
+    def __init__(self, depth: int):
+        self.depth = min(depth, SERP_MAX_DEPTH)
+        self.head = None
+        self.position = 0
+        self.pages = 0
+        self._seen = set()
+
+    def feed(self, page_no: int, page: dict) -> list:
+        self.pages += 1
+        if self.head is None:
+            self.head = {k: v for k, v in page.items() if k != "organic"}
+        items = []
+        for item in page.get("organic", []):
+            link = item.get("link")
+            if link in self._seen or self.position >= self.depth:
+                continue
+            self._seen.add(link)
+            self.position += 1
+            slim = {k: item[k] for k in ORGANIC_FIELDS if k in item}
+            slim["position"] = self.position
+            slim["page"] = page_no
+            items.append(slim)
+        return items
+
+    def summary(self) -> dict:
+        return {"depth": self.depth, "pages": self.pages, "positions": self.position}
+
+
+def _is_last_page(page: dict) -> bool:
+    return len(page.get("organic") or []) < SERP_SHORT_PAGE
+
+
+def _waves(depth: int):
+    pages = list(range(1, page_count(depth) + 1))
+    size = max(1, SERPER_DEEP_WAVE)
+    for start in range(0, len(pages), size):
+        yield pages[start:start + size]
+
+
+def iter_deep_pages(query: str, country: str, language: str, domain: str, depth: int,
+                    policy: str = "interactive"):
+    # Each wave is fetched concurrently and yielded strictly in page order; the next wave is only
+    # requested once the previous one came back full.
+    for wave in _waves(depth):
+        futures = [
+            (page_no, _executor.submit(google_search, query, country, language, domain, policy, page_no))
+            for page_no in wave
+        ]
+        try:
+            for page_no, future in futures:
+                try:
+                    page = future.result()
+                except Exception as e:
+                    if page_no == 1:
+                        raise
+                    logger.warning(f"Deep search stopped at page {page_no} for '{query}': {e}")
+                    return
+                yield page_no, page
+                if _is_last_page(page):
+                    return
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+
+async def aiter_deep_pages(query: str, country: str, language: str, domain: str, depth: int,
+                           policy: str = "interactive"):
+    for wave in _waves(depth):
+        tasks = [
+            (page_no, asyncio.create_task(
+                async_google_search(query, country, language, domain, policy=policy, page=page_no)))
+            for page_no in wave
+        ]
+        try:
+            for page_no, task in tasks:
+                try:
+                    page = await task
+                except Exception as e:
+                    if page_no == 1:
+                        raise
+                    logger.warning(f"Deep search stopped at page {page_no} for '{query}': {e}")
+                    return
+                yield page_no, page
+                if _is_last_page(page):
+                    return
+        finally:
+            for _, task in tasks:
+                task.cancel()
+
+
+def deep_search(query: str, country: str, language: str, domain: str, depth: int,
+                policy: str = "interactive") -> dict:
+    # Raw pages are merged and dropped one by one; a page that adds no new links (Google repeating
+    # the last page) ends the search like a short one.
+    merger = DeepMerger(depth)
+    organic = []
+    pages = iter_deep_pages(query, country, language, domain, depth, policy)
+    try:
+        for page_no, page in pages:
+            items = merger.feed(page_no, page)
+            organic.extend(items)
+            if not items or merger.position >= merger.depth:
+                break
+    finally:
+        pages.close()
+    return {"organic": organic, **(merger.head or {}), "deep": merger.summary()}
+
+
+async def async_deep_search(query: str, country: str, language: str, domain: str, depth: int,
+                            policy: str = "interactive") -> dict:
+    merger = DeepMerger(depth)
+    organic = []
+    async with aclosing(aiter_deep_pages(query, country, language, domain, depth, policy)) as pages:
+        async for page_no, page in pages:
+            items = merger.feed(page_no, page)
+            organic.extend(items)
+            if not items or merger.position >= merger.depth:
+                break
+    return {"organic": organic, **(merger.head or {}), "deep": merger.summary()}
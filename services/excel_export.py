@@ -0,0 +1,148 @@
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import xlsxwriter
+
+from db.database import SessionLocal
+from db.models.search_history import SearchHistory
+from db.results_codec import decode_results
+
+logger = logging.getLogger(__name__)
+
+EXCEL_EXPORT_WORKERS = int(os.getenv("EXCEL_EXPORT_WORKERS", "2"))
+EXCEL_EXPORT_DIR = os.getenv("EXCEL_EXPORT_DIR") or None
+# Rows per worksheet allowed by the xlsx format, header included.
+XLSX_MAX_ROWS = 1048576
+
+# Column layout per Serper section; every section gets its own sheet.
+SECTION_COLUMNS = {
+    "organic": ("position", "title", "link", "snippet", "date"),
+    "topStories": ("title", "link", "source", "date"),
+    "peopleAlsoAsk": ("question", "snippet", "title", "link"),
+    "relatedSearches": ("query",),
+    "images": ("title", "imageUrl", "link"),
+    "videos": ("title", "link", "channel", "date"),
+}
+# Single-object sections, written as field/value rows.
+OBJECT_SECTIONS = ("answerBox", "knowledgeGraph")
+
+# xlsxwriter runs in pure Python; keeping it off the event loop is what matters, a couple
+# of threads is enough since exports are rare compared to searches.
+_executor = ThreadPoolExecutor(max_workers=EXCEL_EXPORT_WORKERS, thread_name_prefix="excel-export")
+
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class SerpWorkbookWriter:
+    # constant_memory mode keeps only the current row of each sheet in memory and flushes
+    # the rest to disk, so rows must be written strictly in order per sheet.
+    # A section that outgrows one sheet continues on "<section> (2)", "<section> (3)", ...
+
+    def __init__(self, path: str, prefix_columns: tuple = ()):
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self.prefix_columns = prefix_columns
+        self._sheets = {}
+        self._rows = {}
+        self._parts = {}
+
+    def _sheet(self, name: str, columns: tuple):
+        sheet = self._sheets.get(name)
+        if sheet is None or self._rows[name] >= XLSX_MAX_ROWS:
+            part = self._parts.get(name, 0) + 1
+            title = name if part == 1 else f"{name} ({part})"
+            sheet = self.workbook.add_worksheet(title[:31])
+            sheet.write_row(0, 0, self.prefix_columns + columns)
+            self._sheets[name] = sheet
+            self._rows[name] = 1
+            self._parts[name] = part
+        return sheet
+
+    def _write(self, name: str, columns: tuple, values):
+        sheet = self._sheet(name, columns)
+        sheet.write_row(self._rows[name], 0, [_cell(v) for v in values])
+        self._rows[name] += 1
+
+    def add(self, results: dict, prefix: tuple = ()):
+        for section, columns in SECTION_COLUMNS.items():
+            for idx, item in enumerate(results.get(section) or [], start=1):
+                if section == "organic" and "position" not in item:
+                    item = {**item, "position": idx}
+                self._write(section, columns, prefix + tuple(item.get(c, "") for c in columns))
+        for section in OBJECT_SECTIONS:
+            obj = results.get(section)
+            if not obj:
+                continue
+            attributes = obj.get("attributes") or {}
+            for field, value in obj.items():
+                if field != "attributes":
+                    self._write(section, ("field", "value"), prefix + (field, value))
+            for field, value in attributes.items():
+                self._write(section, ("field", "value"), prefix + (field, value))
+
+    def close(self):
+        if not self._sheets:
+            self._sheet("organic", SECTION_COLUMNS["organic"])
+        self.workbook.close()
+
+
+def _tempfile_path(prefix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=".xlsx", dir=EXCEL_EXPORT_DIR)
+    os.close(fd)
+    return path
+
+
+def write_results_xlsx(results: dict) -> str:
+    path = _tempfile_path("serp_")
+    writer = SerpWorkbookWriter(path)
+    writer.add(results)
+    writer.close()
+    return path
+
+
+def write_project_xlsx(project_id: int, date_from: date = None, date_to: date = None) -> str:
+    # History rows are streamed out of the DB and written one by one, so neither the
+    # query result nor the workbook is ever held in memory as a whole.
+    path = _tempfile_path(f"project_{project_id}_")
+    writer = SerpWorkbookWriter(path, prefix_columns=("history_id", "query", "created_at"))
+    db = SessionLocal()
+    try:
+        q = db.query(SearchHistory.id, SearchHistory.query_text, SearchHistory.created_at,
+                     *SearchHistory.results_columns()) \
+            .filter(SearchHistory.project_id == project_id)
+        if date_from:
+            q = q.filter(SearchHistory.created_at >= datetime.combine(date_from, datetime.min.time()))
+        if date_to:
+            q = q.filter(SearchHistory.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        for history_id, query_text, created_at, *payload in q.order_by(SearchHistory.id).yield_per(200):
+            try:
+                results = decode_results(*payload)
+            except ValueError as e:
+                logger.warning(f"Skipping unreadable SearchHistory {history_id} in export: {e}")
+                continue
+            writer.add(results, prefix=(history_id, query_text, str(created_at)))
+        writer.close()
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        db.close()
+    return path
+
+
+async def export_results_xlsx(results: dict) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, write_results_xlsx, results)
+
+
+async def export_project_xlsx(project_id: int, date_from: date = None, date_to: date = None) -> str:
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, write_project_xlsx, project_id, date_from, date_to
+    )
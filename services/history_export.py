@@ -0,0 +1,79 @@
+import io
+import os
+import csv
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from db.async_database import AsyncSessionLocal
+from db.models.search_history import SearchHistory
+from db.results_codec import decode_results_text, decode_results
+
+HISTORY_EXPORT_BATCH = int(os.getenv("HISTORY_EXPORT_BATCH", "500"))
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+ORGANIC_COLUMNS = ("position", "title", "link", "snippet", "date")
+ENTRY_COLUMNS = ("history_id", "query_text", "created_at")
+
+
+def _history_query(project_id: int, date_from: date = None, date_to: date = None, query: str = None):
+    stmt = select(SearchHistory.id, SearchHistory.query_text, SearchHistory.created_at,
+                  *SearchHistory.results_columns()).filter_by(project_id=project_id)
+    if date_from:
+        stmt = stmt.where(SearchHistory.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        stmt = stmt.where(SearchHistory.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if query is not None:
+        stmt = stmt.filter_by(query_text=query)
+    return stmt.order_by(SearchHistory.id).execution_options(yield_per=HISTORY_EXPORT_BATCH)
+
+
+def _organic_rows(payload) -> list:
+    try:
+        return decode_results(*payload).get("organic") or []
+    except ValueError:
+        return []
+
+
+def _ndjson_lines(rows, flatten: bool):
+    for history_id, query_text, created_at, *payload in rows:
+        entry = {"history_id": history_id, "query_text": query_text, "created_at": str(created_at)}
+        if flatten:
+            for item in _organic_rows(payload):
+                yield json.dumps({**entry, **{k: item.get(k) for k in ORGANIC_COLUMNS}}, ensure_ascii=False) + "\n"
+        else:
+            # The stored payload already is JSON text, so it is spliced in without a parse/dump round trip.
+            yield json.dumps(entry, ensure_ascii=False)[:-1] + f', "results": {decode_results_text(*payload)}}}\n'
+
+
+def _csv_rows(rows, flatten: bool):
+    for history_id, query_text, created_at, *payload in rows:
+        entry = [history_id, query_text, str(created_at)]
+        if flatten:
+            for item in _organic_rows(payload):
+                yield entry + [item.get(k) for k in ORGANIC_COLUMNS]
+        else:
+            yield entry + [decode_results_text(*payload)]
+
+
+async def stream_history(project_id: int, fmt: str = "ndjson", flatten: bool = False, date_from: date = None,
+                         date_to: date = None, query: str = None):
+    # Rows come from a server-side cursor one yield_per batch at a time and each batch is
+    # encoded and sent before the next is fetched, so memory stays flat and output starts at once.
+    # Uses its own session: request-scoped dependencies are closed before a streamed body runs.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(_history_query(project_id, date_from, date_to, query))
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(ENTRY_COLUMNS + (ORGANIC_COLUMNS if flatten else ("results",)))
+            yield buffer.getvalue()
+            async for partition in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(_csv_rows(partition, flatten))
+                yield buffer.getvalue()
+        else:
+            async for partition in result.partitions():
+                yield "".join(_ndjson_lines(partition, flatten))
@@ -1,11 +1,20 @@
 import os
 import openai
 
+from services.serp_compaction import compact_serp, record_compaction, AI_SERP_TOKEN_BUDGET
+from services.analysis_cache import analysis_cache, analysis_key, aget_analysis
+
 openai.api_key = os.getenv("OPENAI_API_KEY", "")
+# Point at a local fake completion server in tests, e.g. OPENAI_API_BASE=http://127.0.0.1:8081/v1
+openai.api_base = os.getenv("OPENAI_API_BASE", openai.api_base)
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "500"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
 
 
-def analyze_results_with_openai(search_results: dict) -> str:
-    messages = [
+def build_messages(digest: str) -> list:
+    return [
         {
             "role": "system",
             "content": "Ты выступаешь в роли помощника, анализирующего поисковую выдачу."
@@ -13,18 +22,57 @@ def analyze_results_with_openai(search_results: dict) -> str:
         {
             "role": "user",
             "content": (
-                f"Проанализируй следующую Google-выдачу и составь краткое описание:\n"
-                f"{search_results}\n"
+                f"Проанализируй следующую Google-выдачу (позиция. заголовок | домен | сниппет) "
+                f"и составь краткое описание:\n"
+                f"{digest}\n"
             )
         }
     ]
 
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
+
+async def acomplete(messages: list, temperature: float = 0.7) -> str:
+    response = await openai.ChatCompletion.acreate(
+        model=OPENAI_MODEL,
         messages=messages,
-        max_tokens=500,
-        temperature=0.7,
+        max_tokens=OPENAI_MAX_TOKENS,
+        temperature=temperature,
+        request_timeout=OPENAI_TIMEOUT,
     )
+    return response["choices"][0]["message"]["content"].strip()
+
 
-    analyzed_text = response["choices"][0]["message"]["content"].strip()
-    return analyzed_text
+async def cached_analysis(search_results: dict, token_budget: int = AI_SERP_TOKEN_BUDGET):
+    digest, stats = compact_serp(search_results, token_budget)
+    await record_compaction(stats)
+    return await aget_analysis(analysis_key(digest, OPENAI_MODEL), digest)
+
+
+async def stream_analysis(search_results: dict, token_budget: int = AI_SERP_TOKEN_BUDGET):
+    # Yields the analysis text piece by piece as the completion streams in, without blocking the loop.
+    # A cached analysis of the same digest is yielded whole, without calling the model.
+    digest, stats = compact_serp(search_results, token_budget)
+    await record_compaction(stats)
+    key = analysis_key(digest, OPENAI_MODEL)
+    cached = await aget_analysis(key, digest)
+    if cached is not None:
+        yield cached
+        return
+    response = await openai.ChatCompletion.acreate(
+        model=OPENAI_MODEL,
+        messages=build_messages(digest),
+        max_tokens=OPENAI_MAX_TOKENS,
+        temperature=0.7,
+        stream=True,
+        request_timeout=OPENAI_TIMEOUT,
+    )
+    parts = []
+    async for chunk in response:
+        choices = chunk.get("choices") or [{}]
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            yield delta
+    # Only complete answers are cached; an aborted stream never gets here.
+    analyzed_text = "".join(parts).strip()
+    if analyzed_text:
+        await analysis_cache.aset(key, analyzed_text)
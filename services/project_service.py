@@ -0,0 +1,358 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy_celery_beat.models import PeriodicTask, IntervalSchedule, ClockedSchedule, PeriodicTaskChanged
+
+from db.models.project import Project
+from db.models.project_member import ProjectMember
+from db.models.telegram_user import TelegramUser
+from db.models.search_history import SearchHistory
+from db.models.serp_result_item import normalize_domain
+from db.models.rank_daily import RankDaily, QueryDaily
+from db.rank_aggregates import ctr_weight, CTR_BY_POSITION
+from db import repository
+from services.serper_service import async_google_search, async_google_search_batch
+from services.deep_search import async_deep_search, SERP_PAGE_SIZE
+from app.celery_app import celery_app
+from managers.ai_tasks import project_summary_task
+from services.excel_export import export_project_xlsx
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ServiceError(Exception):
+    # Carries the HTTP status the API layer answers with; the bot shows the detail instead.
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def find_user_by_chat_id(db: AsyncSession, chat_id: str):
+    return (await db.execute(select(TelegramUser).filter_by(chat_id=chat_id))).scalar_one_or_none()
+
+
+async def register_user(db: AsyncSession, chat_id: str) -> TelegramUser:
+    user = await find_user_by_chat_id(db, chat_id)
+    if not user:
+        user = TelegramUser(chat_id=chat_id)
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+    return user
+
+
+async def get_user_projects(db: AsyncSession, user_id: int) -> list:
+    rows = await db.execute(
+        select(Project.id, Project.name)
+        .join(ProjectMember, ProjectMember.project_id == Project.id)
+        .filter(ProjectMember.user_id == user_id)
+    )
+    return [{"id": project_id, "name": name} for project_id, name in rows]
+
+
+async def create_project(db: AsyncSession, name: str, user_id: int) -> dict:
+    user = await db.get(TelegramUser, user_id)
+    if not user:
+        raise ServiceError(404, "User not found")
+    project = Project(name=name, creator_id=user.id)
+    db.add(project)
+    await db.flush()
+    db.add(ProjectMember(project_id=project.id, user_id=user.id, role="admin"))
+    await db.commit()
+    return {"project_id": project.id, "name": project.name}
+
+
+async def add_members(db: AsyncSession, project_id: int, usernames: list) -> dict:
+    if not await db.get(Project, project_id):
+        raise ServiceError(404, "Project not found")
+
+    chat_ids = [username.lstrip("@") for username in usernames]
+    users = (await db.execute(select(TelegramUser).filter(TelegramUser.chat_id.in_(chat_ids)))).scalars().all()
+    existing = set((await db.execute(
+        select(ProjectMember.user_id).filter_by(project_id=project_id)
+    )).scalars().all())
+
+    added = []
+    for user in users:
+        if user.id in existing:
+            continue
+        db.add(ProjectMember(project_id=project_id, user_id=user.id, role="member"))
+        existing.add(user.id)
+        added.append(user.chat_id)
+    await db.commit()
+    return {"added": added}
+
+
+async def ensure_member(db: AsyncSession, project_id: int, user_id: int):
+    pm = (await db.execute(
+        select(ProjectMember.id).filter_by(project_id=project_id, user_id=user_id)
+    )).first()
+    if not pm:
+        raise ServiceError(403, "User not in project")
+
+
+async def save_search_history(db: AsyncSession, project_id: int, user_id: int, query: str, results_json: str,
+                              results: dict = None) -> int:
+    row = {"query": query, "results_json": results_json, "results": results}
+    entry_ids = await db.run_sync(repository.add_search_history_entries, project_id, user_id, [row])
+    await db.commit()
+    return entry_ids[0]
+
+
+async def search(db: AsyncSession, project_id: int, user_id: int, query: str, country: str = "US",
+                 language: str = "en", domain: str = "google.com", depth: int = SERP_PAGE_SIZE) -> dict:
+    # Returns the stored JSON text and the parsed results, so callers never serialize or parse
+    # the payload more than once.
+    await ensure_member(db, project_id, user_id)
+    if depth > SERP_PAGE_SIZE:
+        results = await async_deep_search(query, country, language, domain, depth)
+    else:
+        results = await async_google_search(query, country, language, domain)
+    results_json = json.dumps(results)
+    entry_id = await save_search_history(db, project_id, user_id, query, results_json, results)
+    return {"entry_id": entry_id, "results_json": results_json, "results": results}
+
+
+async def search_batch(db: AsyncSession, project_id: int, user_id: int, queries: list,
+                       include_results: bool = False) -> dict:
+    await ensure_member(db, project_id, user_id)
+
+    outcomes = await async_google_search_batch(queries)
+    rows = [
+        {"query": q["query"], "results": outcome["results"]}
+        for q, outcome in zip(queries, outcomes) if outcome["ok"]
+    ]
+    saved = await db.run_sync(repository.add_search_history_entries, project_id, user_id, rows)
+    await db.commit()
+    entry_ids = iter(saved)
+
+    items = []
+    for q, outcome in zip(queries, outcomes):
+        item = {"query": q["query"], "country": q["country"], "language": q["language"], "domain": q["domain"]}
+        if outcome["ok"]:
+            item.update({"status": "ok", "entry_id": next(entry_ids), "cached": outcome["cached"]})
+            if include_results:
+                item["results"] = outcome["results"]
+        else:
+            item.update({"status": "error", "error": outcome["error"]})
+        items.append(item)
+    return {"ok": True, "saved": len(saved), "items": items}
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    # Compact enough for Telegram's 64-byte callback_data: "<epoch microseconds>.<id>".
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}.{item_id}"
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        micros, item_id = cursor.split(".")
+        return _EPOCH + timedelta(microseconds=int(micros)), int(item_id)
+    except ValueError:
+        raise ServiceError(400, "Invalid cursor")
+
+
+async def get_history(db: AsyncSession, project_id: int, limit: int = HISTORY_PAGE_SIZE, cursor: str = None,
+                      direction: str = "next") -> dict:
+    # Keyset pagination, newest first, on (created_at, id) so every page is one index range scan
+    # however deep it is. Only the list columns are selected; results_json is never read here.
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    key = tuple_(SearchHistory.created_at, SearchHistory.id)
+    stmt = select(SearchHistory.id, SearchHistory.query_text, SearchHistory.created_at).filter_by(project_id=project_id)
+    backwards = direction == "prev" and cursor is not None
+    if cursor is not None:
+        bound = tuple_(*decode_cursor(cursor))
+        stmt = stmt.where(key > bound if backwards else key < bound)
+    if backwards:
+        stmt = stmt.order_by(SearchHistory.created_at.asc(), SearchHistory.id.asc())
+    else:
+        stmt = stmt.order_by(SearchHistory.created_at.desc(), SearchHistory.id.desc())
+
+    rows = list(await db.execute(stmt.limit(limit + 1)))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    first = encode_cursor(rows[0].created_at, rows[0].id) if rows else None
+    last = encode_cursor(rows[-1].created_at, rows[-1].id) if rows else None
+    return {
+        "items": [{"id": h.id, "query_text": h.query_text, "created_at": str(h.created_at)} for h in rows],
+        "next_cursor": last if (has_more or backwards) else None,
+        "prev_cursor": first if (cursor is not None and (has_more or not backwards)) else None,
+    }
+
+
+async def get_history_item(db: AsyncSession, project_id: int, item_id: int) -> dict:
+    item = (await db.execute(
+        select(SearchHistory).filter_by(project_id=project_id, id=item_id)
+    )).scalar_one_or_none()
+    if not item:
+        raise ServiceError(404, "Not found")
+    return {
+        "id": item.id,
+        "query_text": item.query_text,
+        "created_at": str(item.created_at),
+        "results": item.results_text()
+    }
+
+
+def _day_range(stmt, column, date_from: date = None, date_to: date = None):
+    if date_from:
+        stmt = stmt.where(column >= date_from)
+    if date_to:
+        stmt = stmt.where(column <= date_to)
+    return stmt
+
+
+async def rank_series(db: AsyncSession, project_id: int, user_id: int, domain: str, query: str = None,
+                      date_from: date = None, date_to: date = None) -> dict:
+    # Daily best and average position of a domain per query, read from rank_daily only.
+    await ensure_member(db, project_id, user_id)
+    domain = normalize_domain(domain)
+    stmt = select(RankDaily.query_text, RankDaily.day, RankDaily.best_position, RankDaily.position_sum,
+                  RankDaily.samples).filter_by(project_id=project_id, domain=domain)
+    if query is not None:
+        stmt = stmt.filter_by(query_text=query)
+    stmt = _day_range(stmt, RankDaily.day, date_from, date_to).order_by(RankDaily.query_text, RankDaily.day)
+
+    series = {}
+    for row in await db.execute(stmt):
+        series.setdefault(row.query_text, []).append({
+            "day": str(row.day),
+            "best": row.best_position,
+            "avg": round(row.position_sum / row.samples, 2),
+        })
+    return {"domain": domain, "series": [{"query": q, "points": points} for q, points in series.items()]}
+
+
+async def visibility(db: AsyncSession, project_id: int, user_id: int, domain: str, date_from: date = None,
+                     date_to: date = None) -> dict:
+    # Per day: CTR-weighted positions of the domain over every query that ran that day,
+    # scaled so 100 means position 1 for all of them.
+    await ensure_member(db, project_id, user_id)
+    domain = normalize_domain(domain)
+    queries = _day_range(
+        select(QueryDaily.day, func.count().label("queries")).filter_by(project_id=project_id),
+        QueryDaily.day, date_from, date_to,
+    ).group_by(QueryDaily.day).subquery()
+    scores = _day_range(
+        select(RankDaily.day, func.sum(ctr_weight(RankDaily.best_position)).label("score"))
+        .filter_by(project_id=project_id, domain=domain),
+        RankDaily.day, date_from, date_to,
+    ).group_by(RankDaily.day).subquery()
+    stmt = select(queries.c.day, queries.c.queries, func.coalesce(scores.c.score, 0).label("score")) \
+        .outerjoin(scores, scores.c.day == queries.c.day) \
+        .order_by(queries.c.day)
+
+    top = CTR_BY_POSITION[1]
+    return {
+        "domain": domain,
+        "days": [
+            {"day": str(row.day), "queries": row.queries, "visibility": round(row.score / (row.queries * top) * 100, 2)}
+            for row in await db.execute(stmt)
+        ],
+    }
+
+
+async def summarize(db: AsyncSession, project_id: int, user_id: int, date_from: date = None,
+                    date_to: date = None) -> dict:
+    # The map-reduce runs on the ai queue like the bot's /summary; summary_result polls for the report.
+    await ensure_member(db, project_id, user_id)
+    task = project_summary_task.delay(
+        project_id,
+        date_from.isoformat() if date_from else None,
+        date_to.isoformat() if date_to else None,
+    )
+    return {"task_id": task.id, "status": "PENDING"}
+
+
+async def summary_result(db: AsyncSession, project_id: int, user_id: int, task_id: str) -> dict:
+    await ensure_member(db, project_id, user_id)
+    result = celery_app.AsyncResult(task_id)
+    # The result backend is the database, reached through a blocking client.
+    state = await asyncio.to_thread(lambda: result.state)
+    if state == "FAILURE":
+        raise ServiceError(502, f"Summary failed: {result.result}")
+    if state != "SUCCESS":
+        return {"task_id": task_id, "status": state}
+    summary = await asyncio.to_thread(lambda: result.result)
+    if summary.get("project_id") != project_id:
+        raise ServiceError(404, "Summary not found")
+    return {"task_id": task_id, "status": state, **summary}
+
+
+async def export_project(db: AsyncSession, project_id: int, user_id: int, date_from: date = None,
+                         date_to: date = None) -> str:
+    # Returns the path of a temporary .xlsx file; the caller sends it and removes it.
+    await ensure_member(db, project_id, user_id)
+    return await export_project_xlsx(project_id, date_from, date_to)
+
+
+def _schedule_search_sync(db, project_id: int, user_id: int, query: str, schedule_type: str,
+                          date_time: str = None, interval_seconds: int = None, country: str = "US",
+                          language: str = "en", domain: str = "google.com", depth: int = SERP_PAGE_SIZE):
+    # Written against the sync Session API; AsyncSession.run_sync drives it over the async connection.
+    if schedule_type == "clocked":
+        try:
+            scheduled_dt = datetime.fromisoformat(date_time)
+        except Exception:
+            raise ServiceError(400, "Invalid date_time format")
+        schedule_obj = db.query(ClockedSchedule).filter_by(clocked_time=scheduled_dt).first()
+        if not schedule_obj:
+            schedule_obj = ClockedSchedule(clocked_time=scheduled_dt)
+            db.add(schedule_obj)
+            db.commit()
+            db.refresh(schedule_obj)
+        one_off = True
+    else:  # interval
+        schedule_obj = db.query(IntervalSchedule).filter_by(every=interval_seconds, period="seconds").first()
+        if not schedule_obj:
+            schedule_obj = IntervalSchedule(every=interval_seconds, period="seconds")
+            db.add(schedule_obj)
+            db.commit()
+            db.refresh(schedule_obj)
+        one_off = False
+
+    task_name = f"project_search_{project_id}_{user_id}_{query[:10]}"
+    task = db.query(PeriodicTask).filter_by(name=task_name).first()
+    if not task:
+        task = PeriodicTask(
+            name=task_name,
+            task="managers.project_tasks.scheduled_search_task",
+            one_off=one_off,
+            enabled=True
+        )
+        db.add(task)
+
+    task.kwargs = json.dumps({
+        "project_id": project_id,
+        "user_id": user_id,
+        "query": query,
+        "country": country,
+        "language": language,
+        "domain": domain,
+        "depth": depth
+    })
+    task.schedule_model = schedule_obj
+    task.start_time = datetime.utcnow()
+    db.commit()
+    db.refresh(task)
+    PeriodicTaskChanged.update_from_session(db)
+    return {"scheduled": True, "message": f"The request is scheduled with the type {schedule_type}"}
+
+
+async def schedule_search(db: AsyncSession, project_id: int, **data) -> dict:
+    await ensure_member(db, project_id, data["user_id"])
+    return await db.run_sync(_schedule_search_sync, project_id, **data)
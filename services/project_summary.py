@@ -0,0 +1,123 @@
+import os
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from db.models.search_history import SearchHistory
+from db.results_codec import decode_results
+from services.serp_compaction import compact_serp, compaction_amounts, compaction_counters
+from services.analysis_cache import analysis_cache, analysis_key, aget_analysis
+from services.openai_service import acomplete, OPENAI_MODEL
+
+logger = logging.getLogger(__name__)
+
+AI_SUMMARY_CHUNK_SIZE = int(os.getenv("AI_SUMMARY_CHUNK_SIZE", "20"))
+AI_SUMMARY_ROW_BUDGET = int(os.getenv("AI_SUMMARY_ROW_BUDGET", "250"))
+AI_SUMMARY_CONCURRENCY = int(os.getenv("AI_SUMMARY_CONCURRENCY", "5"))
+AI_SUMMARY_REDUCE_FANIN = int(os.getenv("AI_SUMMARY_REDUCE_FANIN", "20"))
+AI_SUMMARY_MAX_ROWS = int(os.getenv("AI_SUMMARY_MAX_ROWS", "5000"))
+
+SYSTEM_PROMPT = "Ты выступаешь в роли помощника, анализирующего поисковую выдачу."
+
+
+def _chunk_messages(text: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                "Ниже сохранённые результаты поиска проекта (дата, запрос, затем позиция. заголовок | домен | сниппет). "
+                "Кратко опиши ключевые домены, изменения позиций и заметные темы:\n"
+                f"{text}\n"
+            )
+        }
+    ]
+
+
+def _reduce_messages(text: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                "Ниже частичные сводки по истории поиска одного проекта в хронологическом порядке. "
+                "Объедини их в один отчёт: лидирующие домены, динамика позиций, основные выводы:\n"
+                f"{text}\n"
+            )
+        }
+    ]
+
+
+def load_history_digests(db: Session, project_id: int, date_from: date = None, date_to: date = None) -> list:
+    # One compact digest per stored search, oldest first, so chunk boundaries stay stable
+    # when new rows arrive and earlier chunks keep hitting the cache.
+    q = db.query(SearchHistory.query_text, SearchHistory.created_at, *SearchHistory.results_columns()) \
+        .filter(SearchHistory.project_id == project_id)
+    if date_from:
+        q = q.filter(SearchHistory.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        q = q.filter(SearchHistory.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    # Only the newest AI_SUMMARY_MAX_ROWS are summarized. Older rows are dropped in whole chunks,
+    # so the boundaries of the remaining chunks do not move and their summaries stay cached.
+    skip = max(0, q.count() - AI_SUMMARY_MAX_ROWS)
+    skip = -(-skip // AI_SUMMARY_CHUNK_SIZE) * AI_SUMMARY_CHUNK_SIZE
+    q = q.order_by(SearchHistory.id).offset(skip)
+
+    digests = []
+    totals = {}
+    for query_text, created_at, *payload in q.yield_per(200):
+        try:
+            results = decode_results(*payload)
+        except ValueError:
+            continue
+        digest, stats = compact_serp(results, AI_SUMMARY_ROW_BUDGET)
+        for field, amount in compaction_amounts(stats).items():
+            totals[field] = totals.get(field, 0) + amount
+        if digest:
+            digests.append(f"[{created_at:%Y-%m-%d %H:%M}] {query_text}\n{digest}")
+    if totals:
+        compaction_counters.incr(**totals)
+    return digests
+
+
+async def _cached_complete(messages_fn, text: str):
+    key = analysis_key(f"{messages_fn.__name__}\n{text}", OPENAI_MODEL)
+    cached = await aget_analysis(key, text)
+    if cached is not None:
+        return cached, True
+    result = await acomplete(messages_fn(text), temperature=0.3)
+    await analysis_cache.aset(key, result)
+    return result, False
+
+
+async def summarize_digests(digests: list) -> dict:
+    if not digests:
+        return {"rows": 0, "chunks": 0, "cached_chunks": 0, "report": ""}
+
+    semaphore = asyncio.Semaphore(AI_SUMMARY_CONCURRENCY)
+
+    async def run(messages_fn, text: str):
+        async with semaphore:
+            return await _cached_complete(messages_fn, text)
+
+    chunks = [
+        "\n\n".join(digests[i:i + AI_SUMMARY_CHUNK_SIZE])
+        for i in range(0, len(digests), AI_SUMMARY_CHUNK_SIZE)
+    ]
+    mapped = await asyncio.gather(*(run(_chunk_messages, chunk) for chunk in chunks))
+    summaries = [text for text, _ in mapped]
+    cached_chunks = sum(1 for _, hit in mapped if hit)
+    logger.info(f"Project summary map: {len(chunks)} chunks, {cached_chunks} cached")
+
+    # Reduce level by level, each level in parallel, until one report is left.
+    while len(summaries) > 1:
+        groups = [
+            "\n\n---\n\n".join(summaries[i:i + AI_SUMMARY_REDUCE_FANIN])
+            for i in range(0, len(summaries), AI_SUMMARY_REDUCE_FANIN)
+        ]
+        reduced = await asyncio.gather(*(run(_reduce_messages, group) for group in groups))
+        summaries = [text for text, _ in reduced]
+
+    return {"rows": len(digests), "chunks": len(chunks), "cached_chunks": cached_chunks, "report": summaries[0]}
@@ -0,0 +1,280 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+
+import redis
+
+from services.redis_client import get_redis, get_async_redis
+from services.cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "1"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "60"))
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", "10000"))
+
+# Token bucket shared by every process. Uses the Redis clock so workers with skewed clocks agree.
+# KEYS[2..] are backoff windows (shared, and per key when the bucket is keyed) checked first.
+# Returns 0 when a token was taken, otherwise the number of ms to wait (bucket refill or backoff).
+_ACQUIRE_SCRIPT = """
+local bucket_key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+for i = 2, #KEYS do
+    local backoff_until = tonumber(redis.call('GET', KEYS[i]) or '0')
+    if backoff_until > now then
+        return backoff_until - now
+    end
+end
+
+local state = redis.call('HMGET', bucket_key, 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', bucket_key, 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', bucket_key, math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+# Grows the shared backoff window exponentially on consecutive upstream rejections.
+_BACKOFF_SCRIPT = """
+local backoff_key = KEYS[1]
+local level_key = KEYS[2]
+local base_ms = tonumber(ARGV[1])
+local max_ms = tonumber(ARGV[2])
+local retry_after_ms = tonumber(ARGV[3])
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local level = redis.call('INCR', level_key)
+redis.call('PEXPIRE', level_key, max_ms * 2)
+local delay = math.min(max_ms, base_ms * 2 ^ (level - 1))
+if retry_after_ms > delay then
+    delay = retry_after_ms
+end
+local current = tonumber(redis.call('GET', backoff_key) or '0')
+local target = now + delay
+if target > current then
+    redis.call('SET', backoff_key, target, 'PX', delay)
+end
+return delay
+"""
+
+
+# Holds one backoff window for exactly the given time, extending but never shortening it.
+_PAUSE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local delay = tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if now + delay > current then
+    redis.call('SET', KEYS[1], now + delay, 'PX', delay)
+end
+return delay
+"""
+
+
+class RateLimitTimeout(Exception):
+    def __init__(self, budget: str, retry_after: float):
+        super().__init__(f"Rate limit budget '{budget}' exhausted, retry in {retry_after:.1f}s")
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+class _LocalBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, cost: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return 0.0
+            return (cost - self.tokens) / self.rate
+
+
+class RedisRateLimiter:
+    # Named budgets (rate per second + burst capacity) that share one upstream backoff window.
+    # A budget can be split per key (e.g. per chat): every key gets its own bucket with the same rate.
+    # If Redis is unreachable each process falls back to its own local bucket with the same budget.
+
+    def __init__(self, prefix: str, budgets: dict):
+        self.prefix = prefix
+        self.budgets = budgets
+        self.backoff_key = f"{prefix}:backoff"
+        self.level_key = f"{prefix}:backoff:level"
+        self.counters = {"granted": 0, "waited": 0, "timeouts": 0, "backoffs": 0}
+        self._local = {name: _LocalBucket(rate, capacity) for name, (rate, capacity) in budgets.items()}
+        self._local_keyed = LRUTTLCache(RATE_LIMIT_LOCAL_KEYS, RATE_LIMIT_BACKOFF_MAX * 10)
+        self._local_paused = LRUTTLCache(RATE_LIMIT_LOCAL_KEYS, RATE_LIMIT_BACKOFF_MAX * 10)
+        self._local_backoff_until = 0.0
+        self._backoff_seen = False
+
+    def _bucket_key(self, budget: str, key: str = None) -> str:
+        if key is None:
+            return f"{self.prefix}:bucket:{budget}"
+        return f"{self.prefix}:bucket:{budget}:{key}"
+
+    def _script_keys(self, budget: str, key: str = None) -> list:
+        keys = [self._bucket_key(budget, key), self.backoff_key]
+        if key is not None:
+            keys.append(f"{self.prefix}:backoff:{budget}:{key}")
+        return keys
+
+    def _local_bucket(self, budget: str, key: str = None) -> _LocalBucket:
+        if key is None:
+            return self._local[budget]
+        bucket = self._local_keyed.get((budget, key))
+        if bucket is None:
+            bucket = _LocalBucket(*self.budgets[budget])
+            self._local_keyed.set((budget, key), bucket)
+        return bucket
+
+    def _local_take(self, budget: str, cost: float, key: str = None) -> float:
+        backoff = max(self._local_backoff_until, self._local_paused.get((budget, key)) or 0) - time.monotonic()
+        if backoff > 0:
+            return backoff
+        return self._local_bucket(budget, key).take(cost)
+
+    def _try(self, budget: str, cost: float, key: str = None) -> float:
+        rate, capacity = self.budgets[budget]
+        try:
+            keys = self._script_keys(budget, key)
+            wait_ms = get_redis().eval(_ACQUIRE_SCRIPT, len(keys), *keys, rate, capacity, cost)
+            return int(wait_ms) / 1000
+        except redis.RedisError as e:
+            logger.warning(f"[ratelimit:{self.prefix}] Redis unavailable, using local bucket: {e}")
+            return self._local_take(budget, cost, key)
+
+    async def _atry(self, budget: str, cost: float, key: str = None) -> float:
+        rate, capacity = self.budgets[budget]
+        try:
+            keys = self._script_keys(budget, key)
+            wait_ms = await get_async_redis().eval(_ACQUIRE_SCRIPT, len(keys), *keys, rate, capacity, cost)
+            return int(wait_ms) / 1000
+        except redis.RedisError as e:
+            logger.warning(f"[ratelimit:{self.prefix}] Redis unavailable, using local bucket: {e}")
+            return self._local_take(budget, cost, key)
+
+    def acquire(self, budget: str, max_wait: float, cost: float = 1, key: str = None):
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            wait = self._try(budget, cost, key)
+            if wait <= 0:
+                self.counters["granted"] += 1
+                self.counters["waited"] += int(waited)
+                return
+            if time.monotonic() + wait > deadline:
+                self.counters["timeouts"] += 1
+                raise RateLimitTimeout(budget, wait)
+            waited = True
+            time.sleep(wait)
+
+    async def aacquire(self, budget: str, max_wait: float, cost: float = 1, key: str = None):
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            wait = await self._atry(budget, cost, key)
+            if wait <= 0:
+                self.counters["granted"] += 1
+                self.counters["waited"] += int(waited)
+                return
+            if time.monotonic() + wait > deadline:
+                self.counters["timeouts"] += 1
+                raise RateLimitTimeout(budget, wait)
+            waited = True
+            await asyncio.sleep(wait)
+
+    def _backoff_args(self, retry_after: float = None):
+        return (
+            int(RATE_LIMIT_BACKOFF_BASE * 1000),
+            int(RATE_LIMIT_BACKOFF_MAX * 1000),
+            int((retry_after or 0) * 1000),
+        )
+
+    def _local_backoff(self, retry_after: float = None) -> float:
+        delay = max(retry_after or 0, RATE_LIMIT_BACKOFF_BASE)
+        self._local_backoff_until = max(self._local_backoff_until, time.monotonic() + delay)
+        return delay
+
+    def backoff(self, retry_after: float = None) -> float:
+        self.counters["backoffs"] += 1
+        self._backoff_seen = True
+        try:
+            delay_ms = get_redis().eval(_BACKOFF_SCRIPT, 2, self.backoff_key, self.level_key,
+                                        *self._backoff_args(retry_after))
+            delay = int(delay_ms) / 1000
+        except redis.RedisError:
+            delay = self._local_backoff(retry_after)
+        logger.warning(f"[ratelimit:{self.prefix}] Upstream rejected request, backing off {delay:.1f}s")
+        return delay
+
+    async def abackoff(self, retry_after: float = None) -> float:
+        self.counters["backoffs"] += 1
+        self._backoff_seen = True
+        try:
+            delay_ms = await get_async_redis().eval(_BACKOFF_SCRIPT, 2, self.backoff_key, self.level_key,
+                                                    *self._backoff_args(retry_after))
+            delay = int(delay_ms) / 1000
+        except redis.RedisError:
+            delay = self._local_backoff(retry_after)
+        logger.warning(f"[ratelimit:{self.prefix}] Upstream rejected request, backing off {delay:.1f}s")
+        return delay
+
+    async def apause(self, seconds: float, budget: str = None, key: str = None) -> float:
+        # Holds requests for exactly `seconds`, without the exponential escalation of abackoff:
+        # every budget when no key is given, otherwise only that key's bucket of the budget.
+        self.counters["backoffs"] += 1
+        backoff_key = self.backoff_key if key is None else self._script_keys(budget, key)[2]
+        try:
+            await get_async_redis().eval(_PAUSE_SCRIPT, 1, backoff_key, int(seconds * 1000))
+        except redis.RedisError:
+            until = time.monotonic() + seconds
+            if key is None:
+                self._local_backoff_until = max(self._local_backoff_until, until)
+            else:
+                self._local_paused.set((budget, key), max(until, self._local_paused.get((budget, key)) or 0))
+        logger.warning(f"[ratelimit:{self.prefix}] Paused {key or 'all'} for {seconds:.1f}s")
+        return seconds
+
+    def success(self):
+        # Reset the exponential level once upstream accepts requests again.
+        if not self._backoff_seen:
+            return
+        self._backoff_seen = False
+        try:
+            get_redis().delete(self.level_key)
+        except redis.RedisError:
+            pass
+
+    async def asuccess(self):
+        if not self._backoff_seen:
+            return
+        self._backoff_seen = False
+        try:
+            await get_async_redis().delete(self.level_key)
+        except redis.RedisError:
+            pass
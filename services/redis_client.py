@@ -0,0 +1,43 @@
+import os
+import asyncio
+import weakref
+import threading
+
+import redis
+import redis.asyncio as aioredis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1"))
+
+_lock = threading.Lock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis(url: str = REDIS_URL) -> redis.Redis:
+    # One client (connection pool) per url per process; re-created after fork.
+    key = (url, os.getpid())
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = redis.Redis.from_url(
+                    url, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+                )
+                _clients[key] = client
+    return client
+
+
+def get_async_redis(url: str = REDIS_URL) -> aioredis.Redis:
+    # asyncio connections are bound to the loop that opened them, so keep one client per loop.
+    # Keyed weakly by the loop object itself: a dead loop's clients go with it and are never
+    # handed to a new loop that happens to reuse its id().
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(url)
+    if client is None:
+        client = aioredis.Redis.from_url(
+            url, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+        clients[url] = client
+    return client
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import zlib
+import logging
+
+import redis
+
+from services.cache import LRUTTLCache, REDIS_RETRY_AFTER
+from services.redis_client import REDIS_URL, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", "3600"))
+RESULT_STORE_LOCAL_SIZE = int(os.getenv("RESULT_STORE_LOCAL_SIZE", "256"))
+
+
+class ResultStore:
+    # Per-user search results that a bot flow needs between callbacks. Values are stored as
+    # zlib-compressed JSON with a TTL, so abandoned flows expire on their own.
+    # Redis is the shared store so any bot replica can serve the next callback; the bounded
+    # local LRU is only used while Redis is unreachable.
+
+    def __init__(self, namespace: str, ttl: int = RESULT_STORE_TTL, local_size: int = RESULT_STORE_LOCAL_SIZE,
+                 redis_url: str = REDIS_URL):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.local = LRUTTLCache(local_size, ttl)
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "bytes_in": 0, "bytes_stored": 0, "redis_errors": 0}
+        self._redis_down_until = 0.0
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _redis_available(self) -> bool:
+        return bool(self.redis_url) and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception):
+        self.counters["redis_errors"] += 1
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+        logger.warning(f"[results:{self.namespace}] Redis unavailable, using local store: {e}")
+
+    def _encode(self, value) -> bytes:
+        raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        blob = zlib.compress(raw, 6)
+        self.counters["bytes_in"] += len(raw)
+        self.counters["bytes_stored"] += len(blob)
+        return blob
+
+    @staticmethod
+    def _decode(blob: bytes):
+        return json.loads(zlib.decompress(blob))
+
+    async def get(self, key):
+        blob = None
+        if self._redis_available():
+            try:
+                blob = await get_async_redis(self.redis_url).get(self._key(key))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        if blob is None:
+            blob = self.local.get(str(key))
+        if blob is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return self._decode(blob)
+
+    async def set(self, key, value):
+        blob = self._encode(value)
+        self.counters["sets"] += 1
+        if self._redis_available():
+            try:
+                await get_async_redis(self.redis_url).set(self._key(key), blob, ex=self.ttl)
+                self.local.delete(str(key))
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        self.local.set(str(key), blob)
+
+    async def delete(self, key):
+        self.local.delete(str(key))
+        if self._redis_available():
+            try:
+                await get_async_redis(self.redis_url).delete(self._key(key))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    def stats(self) -> dict:
+        stored = self.counters["bytes_stored"]
+        return {
+            **self.counters,
+            "local_size": len(self.local),
+            "compression_ratio": round(self.counters["bytes_in"] / stored, 2) if stored else None,
+        }
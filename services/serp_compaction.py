@@ -0,0 +1,82 @@
+import os
+import math
+import logging
+from urllib.parse import urlparse
+
+from services.shared_counters import SharedCounters
+
+logger = logging.getLogger(__name__)
+
+AI_SERP_TOKEN_BUDGET = int(os.getenv("AI_SERP_TOKEN_BUDGET", "1500"))
+AI_SNIPPET_CHARS = int(os.getenv("AI_SNIPPET_CHARS", "160"))
+# Rough chars-per-token ratio for mixed Latin/Cyrillic text; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+compaction_counters = SharedCounters("ai:compaction", ("compactions", "raw_tokens", "digest_tokens", "saved_tokens"))
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _domain(link: str) -> str:
+    netloc = urlparse(link or "").netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def _trim(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0]
+    return cut + "..."
+
+
+def compact_serp(search_results: dict, token_budget: int = AI_SERP_TOKEN_BUDGET) -> tuple:
+    # Ranked digest "position. title | domain | snippet", cut at the first line that
+    # would exceed the budget so the same input always yields the same digest.
+    organic = sorted(
+        search_results.get("organic", []),
+        key=lambda item: item.get("position") or 0,
+    )
+    lines = []
+    used = 0
+    for idx, item in enumerate(organic, start=1):
+        position = item.get("position") or idx
+        line = f"{position}. {_trim(item.get('title', ''), 120)} | {_domain(item.get('link', ''))}"
+        snippet = _trim(item.get("snippet", ""), AI_SNIPPET_CHARS)
+        full_line = f"{line} | {snippet}" if snippet else line
+        cost = estimate_tokens(full_line) + 1
+        if used + cost > token_budget:
+            cost = estimate_tokens(line) + 1
+            if used + cost > token_budget:
+                break
+            full_line = line
+        lines.append(full_line)
+        used += cost
+
+    digest = "\n".join(lines)
+    raw_tokens = estimate_tokens(str(search_results))
+    digest_tokens = estimate_tokens(digest)
+    stats = {
+        "raw_tokens": raw_tokens,
+        "digest_tokens": digest_tokens,
+        "saved_tokens": max(0, raw_tokens - digest_tokens),
+        "items": len(lines),
+        "truncated": len(organic) - len(lines),
+    }
+    logger.info(f"SERP compacted: {stats}")
+    return digest, stats
+
+
+def compaction_amounts(stats: dict) -> dict:
+    return {
+        "compactions": 1,
+        "raw_tokens": stats["raw_tokens"],
+        "digest_tokens": stats["digest_tokens"],
+        "saved_tokens": stats["saved_tokens"],
+    }
+
+
+async def record_compaction(stats: dict):
+    await compaction_counters.aincr(**compaction_amounts(stats))
@@ -1,24 +1,492 @@
 import os
-import requests
+import math
+import time
+import hashlib
+import asyncio
+import logging
+import weakref
+import threading
+from collections import deque
+
+import httpx
+
+from services.cache import TwoTierCache
+from services.rate_limiter import RedisRateLimiter, RateLimitTimeout
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.shared_counters import SharedCounters
+from services.singleflight import ThreadSingleFlight, AsyncSingleFlight, RedisSingleFlight, RemoteFlightError
+
+logger = logging.getLogger(__name__)
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY", "")
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")
+SERPER_TIMEOUT = float(os.getenv("SERPER_TIMEOUT", "15"))
+SERPER_CONNECT_TIMEOUT = float(os.getenv("SERPER_CONNECT_TIMEOUT", "5"))
+SERPER_MAX_CONNECTIONS = int(os.getenv("SERPER_MAX_CONNECTIONS", "20"))
+SERPER_MAX_KEEPALIVE = int(os.getenv("SERPER_MAX_KEEPALIVE", "10"))
+SERPER_KEEPALIVE_EXPIRY = float(os.getenv("SERPER_KEEPALIVE_EXPIRY", "60"))
+SERPER_LATENCY_WINDOW = int(os.getenv("SERPER_LATENCY_WINDOW", "500"))
+SERPER_BREAKER_THRESHOLD = int(os.getenv("SERPER_BREAKER_THRESHOLD", "5"))
+SERPER_BREAKER_RESET_TIMEOUT = float(os.getenv("SERPER_BREAKER_RESET_TIMEOUT", "30"))
+SERPER_HEDGE_ENABLED = os.getenv("SERPER_HEDGE_ENABLED", "1") == "1"
+SERPER_HEDGE_MIN_SAMPLES = int(os.getenv("SERPER_HEDGE_MIN_SAMPLES", "20"))
+SERPER_HEDGE_DEFAULT_DELAY = float(os.getenv("SERPER_HEDGE_DEFAULT_DELAY", "1.0"))
+SERPER_HEDGE_MIN_DELAY = float(os.getenv("SERPER_HEDGE_MIN_DELAY", "0.2"))
+SERPER_MAX_RETRIES = int(os.getenv("SERPER_MAX_RETRIES", "2"))
+SERPER_BATCH_SIZE = int(os.getenv("SERPER_BATCH_SIZE", "100"))
+SERPER_BATCH_CONCURRENCY = int(os.getenv("SERPER_BATCH_CONCURRENCY", "4"))
 
+SERP_PAGE_SIZE = 10
+SERP_MAX_DEPTH = int(os.getenv("SERP_MAX_DEPTH", "100"))
+
+SERP_CACHE_TTL = int(os.getenv("SERP_CACHE_TTL", "86400"))
+SERP_CACHE_L1_SIZE = int(os.getenv("SERP_CACHE_L1_SIZE", "512"))
+SERP_CACHE_L1_TTL = int(os.getenv("SERP_CACHE_L1_TTL", "120"))
+
+# Requests per second and burst size for each traffic class, shared cluster-wide through Redis,
+# plus how long a caller of that class may wait for a token before giving up.
+SERPER_RATE_BUDGETS = {
+    "interactive": (float(os.getenv("SERPER_RATE_INTERACTIVE", "5")), float(os.getenv("SERPER_BURST_INTERACTIVE", "10"))),
+    "scheduled": (float(os.getenv("SERPER_RATE_SCHEDULED", "10")), float(os.getenv("SERPER_BURST_SCHEDULED", "20"))),
+}
+SERPER_RATE_MAX_WAIT = {
+    "interactive": float(os.getenv("SERPER_RATE_MAX_WAIT_INTERACTIVE", "5")),
+    "scheduled": float(os.getenv("SERPER_RATE_MAX_WAIT_SCHEDULED", "60")),
+}
+# Per-call read timeout: interactive callers should not sit out the full scheduled timeout.
+SERPER_TIMEOUTS = {
+    "interactive": float(os.getenv("SERPER_TIMEOUT_INTERACTIVE", "5")),
+    "scheduled": SERPER_TIMEOUT,
+}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Coalesce identical in-flight queries across processes (Celery prefork) through Redis as well.
+SERPER_SINGLEFLIGHT_REDIS = os.getenv("SERPER_SINGLEFLIGHT_REDIS", "1") == "1"
+
+# Max acceptable age (seconds) of a cached SERP per caller type; 0 always goes upstream.
+FRESHNESS_POLICIES = {
+    "interactive": int(os.getenv("SERP_MAX_AGE_INTERACTIVE", "300")),
+    "scheduled": int(os.getenv("SERP_MAX_AGE_SCHEDULED", "0")),
+}
 
-def google_search(query: str, country: str, language: str, domain: str) -> dict:
-    url = "https://google.serper.dev/search"
-    headers = {
-        "X-API-KEY": SERPER_API_KEY,
-        "Content-Type": "application/json"
-    }
 
+def build_payload(query: str, country: str, language: str, domain: str, page: int = 1) -> dict:
     payload = {
         "q": query,
         "gl": country,
         "hl": language,
         "googleDomain": domain
     }
+    if page > 1:
+        payload["page"] = page
+    return payload
+
+
+class SerperUnavailable(Exception):
+    def __init__(self, status_code: int, retry_after: float):
+        super().__init__(f"Serper responded {status_code}, retry in {retry_after:.1f}s")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_query(query: str, country: str, language: str, domain: str) -> tuple:
+    return (
+        " ".join(query.split()).lower(),
+        (country or "").strip().lower(),
+        (language or "").strip().lower(),
+        (domain or "").strip().lower(),
+    )
+
+
+def search_cache_key(query: str, country: str, language: str, domain: str, page: int = 1) -> str:
+    parts = normalize_query(query, country, language, domain)
+    if page > 1:
+        parts += (str(page),)
+    raw = "\x1f".join(parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SerperClient:
+    # One pooled keep-alive client per process (and per event loop for the async side).
+    # Clients are created lazily and re-created after fork, so prefork Celery workers are safe.
+
+    def __init__(self, api_key: str = SERPER_API_KEY, url: str = SERPER_URL):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = httpx.Timeout(SERPER_TIMEOUT, connect=SERPER_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(
+            max_connections=SERPER_MAX_CONNECTIONS,
+            max_keepalive_connections=SERPER_MAX_KEEPALIVE,
+            keepalive_expiry=SERPER_KEEPALIVE_EXPIRY,
+        )
+        self.limiter = RedisRateLimiter("serper:ratelimit", SERPER_RATE_BUDGETS)
+        self.breaker = CircuitBreaker("serper", SERPER_BREAKER_THRESHOLD, SERPER_BREAKER_RESET_TIMEOUT)
+        self.counters = {"calls": 0, "errors": 0, "hedges": 0, "hedge_wins": 0}
+        self.latencies = deque(maxlen=SERPER_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_pid = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_pid = None
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "X-API-KEY": self.api_key,
+            "Content-Type": "application/json"
+        }
+
+    def _get_client(self) -> httpx.Client:
+        pid = os.getpid()
+        if self._client is None or self._client_pid != pid:
+            with self._lock:
+                if self._client is None or self._client_pid != pid:
+                    self._client = httpx.Client(timeout=self.timeout, limits=self.limits, headers=self.headers)
+                    self._client_pid = pid
+        return self._client
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # One client per event loop, keyed weakly by the loop object: a client is never shared
+        # between loops or handed to a new loop that reuses a dead one's id().
+        pid = os.getpid()
+        if self._async_pid != pid:
+            # Inherited across fork: the sockets belong to the parent, so drop them without closing.
+            self._async_clients = weakref.WeakKeyDictionary()
+            self._async_pid = pid
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits, headers=self.headers)
+            self._async_clients[loop] = client
+        return client
+
+    def _record(self, started: float, ok: bool, query: str):
+        latency = time.perf_counter() - started
+        self.latencies.append(latency)
+        self.counters["calls"] += 1
+        if not ok:
+            self.counters["errors"] += 1
+        logger.info(f"Serper query='{query}' ok={ok} latency={latency * 1000:.1f}ms")
+        return latency
+
+    def _timeout(self, budget: str) -> httpx.Timeout:
+        return httpx.Timeout(SERPER_TIMEOUTS[budget], connect=SERPER_CONNECT_TIMEOUT)
+
+    def _check_response(self, response: httpx.Response):
+        # 429 is throttling, not ill health; only 5xx counts against the breaker.
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        elif response.status_code != 429:
+            self.breaker.record_success()
+
+    def _post(self, payload, budget: str, label: str):
+        max_wait = SERPER_RATE_MAX_WAIT[budget]
+        for attempt in range(SERPER_MAX_RETRIES + 1):
+            self.breaker.check()
+            self.limiter.acquire(budget, max_wait)
+            probe = self.breaker.before_call()
+            started = time.perf_counter()
+            ok = False
+            try:
+                try:
+                    response = self._get_client().post(self.url, json=payload, timeout=self._timeout(budget))
+                except httpx.TransportError:
+                    self.breaker.record_failure()
+                    raise
+                self._check_response(response)
+                if response.status_code in RETRYABLE_STATUSES:
+                    delay = self.limiter.backoff(_retry_after(response))
+                    if attempt < SERPER_MAX_RETRIES:
+                        continue
+                    raise SerperUnavailable(response.status_code, delay)
+                response.raise_for_status()
+                ok = True
+                self.limiter.success()
+                return response.json()
+            finally:
+                # 429s, cancellations and errors the breaker does not judge leave the probe slot free.
+                self.breaker.release(probe)
+                self._record(started, ok, label)
+
+    async def _apost(self, payload, budget: str, label: str):
+        max_wait = SERPER_RATE_MAX_WAIT[budget]
+        for attempt in range(SERPER_MAX_RETRIES + 1):
+            self.breaker.check()
+            await self.limiter.aacquire(budget, max_wait)
+            probe = self.breaker.before_call()
+            started = time.perf_counter()
+            ok = False
+            try:
+                try:
+                    response = await self._get_async_client().post(
+                        self.url, json=payload, timeout=self._timeout(budget)
+                    )
+                except httpx.TransportError:
+                    self.breaker.record_failure()
+                    raise
+                self._check_response(response)
+                if response.status_code in RETRYABLE_STATUSES:
+                    delay = await self.limiter.abackoff(_retry_after(response))
+                    if attempt < SERPER_MAX_RETRIES:
+                        continue
+                    raise SerperUnavailable(response.status_code, delay)
+                response.raise_for_status()
+                ok = True
+                await self.limiter.asuccess()
+                return response.json()
+            finally:
+                # 429s, cancellations and errors the breaker does not judge leave the probe slot free.
+                self.breaker.release(probe)
+                self._record(started, ok, label)
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < SERPER_HEDGE_MIN_SAMPLES:
+            return SERPER_HEDGE_DEFAULT_DELAY
+        return max(SERPER_HEDGE_MIN_DELAY, self.latency_percentile(95))
+
+    async def _ahedged(self, payload, budget: str, label: str):
+        # Fire a second identical request if the first has not answered within the p95 latency,
+        # and take whichever succeeds first.
+        first = asyncio.create_task(self._apost(payload, budget, label))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if not done:
+                self.counters["hedges"] += 1
+                pending.add(asyncio.create_task(self._apost(payload, budget, f"{label} [hedge]")))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def search(self, query: str, country: str, language: str, domain: str, budget: str = "interactive",
+               page: int = 1) -> dict:
+        return self._post(build_payload(query, country, language, domain, page), budget, query)
+
+    async def asearch(self, query: str, country: str, language: str, domain: str,
+                      budget: str = "interactive", hedge: bool = False, page: int = 1) -> dict:
+        payload = build_payload(query, country, language, domain, page)
+        if hedge:
+            return await self._ahedged(payload, budget, query)
+        return await self._apost(payload, budget, query)
+
+    def search_batch(self, payloads: list, budget: str = "interactive") -> list:
+        # Serper accepts a JSON array of queries and answers with an array in the same order.
+        return self._post(payloads, budget, f"<batch of {len(payloads)}>")
+
+    async def asearch_batch(self, payloads: list, budget: str = "interactive") -> list:
+        return await self._apost(payloads, budget, f"<batch of {len(payloads)}>")
+
+    def latency_percentile(self, percentile: float) -> float | None:
+        samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self) -> dict:
+        last = self.latencies[-1] if self.latencies else None
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        # Latencies and breaker state belong to this process; the call counters are shared in Redis.
+        return {
+            "last_latency_ms": round(last * 1000, 1) if last is not None else None,
+            "p50_latency_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+serper_client = SerperClient()
+serp_cache = TwoTierCache("serp", SERP_CACHE_L1_SIZE, SERP_CACHE_TTL, l1_ttl=SERP_CACHE_L1_TTL)
+thread_flight = ThreadSingleFlight()
+async_flight = AsyncSingleFlight()
+redis_flight = RedisSingleFlight("serper:flight")
+fallback_counters = {"stale_served": 0}
+
+# Totals across the API, bot and Celery workers, read by /metrics/serper.
+shared_counters = {
+    "client": SharedCounters.mirror("metrics:serper:client", serper_client.counters),
+    "breaker": SharedCounters.mirror("metrics:serper:breaker", serper_client.breaker.counters),
+    "rate_limiter": SharedCounters.mirror("metrics:serper:ratelimit", serper_client.limiter.counters),
+    "cache": SharedCounters.mirror("metrics:serper:cache", serp_cache.counters),
+    "fallback": SharedCounters.mirror("metrics:serper:fallback", fallback_counters),
+    "singleflight_thread": SharedCounters.mirror("metrics:serper:flight:thread", thread_flight.counters),
+    "singleflight_async": SharedCounters.mirror("metrics:serper:flight:async", async_flight.counters),
+    "singleflight_redis": SharedCounters.mirror("metrics:serper:flight:redis", redis_flight.counters),
+}
+
+UPSTREAM_ERRORS = (CircuitOpenError, SerperUnavailable, RateLimitTimeout, RemoteFlightError, httpx.HTTPError)
+
+
+def _stale_fallback(cached, error: Exception):
+    if cached is None:
+        raise error
+    fallback_counters["stale_served"] += 1
+    logger.warning(f"Serper unavailable ({error}), serving stale cached result")
+    return cached
+
+
+def google_search(query: str, country: str, language: str, domain: str, policy: str = "interactive",
+                  page: int = 1) -> dict:
+    key = search_cache_key(query, country, language, domain, page)
+    max_age = FRESHNESS_POLICIES[policy]
+    if max_age > 0:
+        cached = serp_cache.get(key, max_age=max_age)
+        if cached is not None:
+            return cached
+
+    def fetch():
+        results = serper_client.search(query, country, language, domain, budget=policy, page=page)
+        serp_cache.set(key, results)
+        return results
+
+    try:
+        if SERPER_SINGLEFLIGHT_REDIS:
+            return thread_flight.do(key, lambda: redis_flight.do(key, fetch))
+        return thread_flight.do(key, fetch)
+    except UPSTREAM_ERRORS as e:
+        # Callers that tolerate staleness get the last known result while upstream is unhealthy.
+        if max_age <= 0:
+            raise
+        return _stale_fallback(serp_cache.get(key), e)
+
+
+async def async_google_search(query: str, country: str, language: str, domain: str,
+                              policy: str = "interactive", page: int = 1) -> dict:
+    key = search_cache_key(query, country, language, domain, page)
+    max_age = FRESHNESS_POLICIES[policy]
+    if max_age > 0:
+        cached = await serp_cache.aget(key, max_age=max_age)
+        if cached is not None:
+            return cached
+
+    async def fetch():
+        hedge = SERPER_HEDGE_ENABLED and policy == "interactive"
+        results = await serper_client.asearch(
+            query, country, language, domain, budget=policy, hedge=hedge, page=page
+        )
+        await serp_cache.aset(key, results)
+        return results
+
+    try:
+        if SERPER_SINGLEFLIGHT_REDIS:
+            return await async_flight.do(key, lambda: redis_flight.ado(key, fetch))
+        return await async_flight.do(key, fetch)
+    except UPSTREAM_ERRORS as e:
+        if max_age <= 0:
+            raise
+        return _stale_fallback(await serp_cache.aget(key), e)
+
+
+def _plan_batch(queries: list, max_age: int, cached_lookup):
+    # Returns per-input outcomes (cache hits filled in) and the unique keys still to fetch.
+    outcomes = [None] * len(queries)
+    pending = {}
+    for i, q in enumerate(queries):
+        key = search_cache_key(q["query"], q["country"], q["language"], q["domain"])
+        cached = cached_lookup(key) if max_age > 0 else None
+        if cached is not None:
+            outcomes[i] = {"ok": True, "results": cached, "cached": True}
+            continue
+        if key not in pending:
+            pending[key] = {"payload": build_payload(q["query"], q["country"], q["language"], q["domain"]), "indexes": []}
+        pending[key]["indexes"].append(i)
+    return outcomes, pending
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _apply_chunk(outcomes: list, chunk: list, pending: dict, chunk_results=None, error: Exception = None):
+    for n, key in enumerate(chunk):
+        if error is None and n < len(chunk_results):
+            outcome = {"ok": True, "results": chunk_results[n], "cached": False}
+        else:
+            outcome = {"ok": False, "error": str(error) if error else "missing result in batch response"}
+        for i in pending[key]["indexes"]:
+            outcomes[i] = outcome
+
+
+def google_search_batch(queries: list, policy: str = "interactive") -> list:
+    max_age = FRESHNESS_POLICIES[policy]
+    outcomes, pending = _plan_batch(queries, max_age, lambda key: serp_cache.get(key, max_age=max_age))
+    for chunk in _chunks(list(pending), SERPER_BATCH_SIZE):
+        try:
+            chunk_results = serper_client.search_batch([pending[key]["payload"] for key in chunk], budget=policy)
+        except Exception as e:
+            logger.error(f"Serper batch chunk failed: {e}")
+            _apply_chunk(outcomes, chunk, pending, error=e)
+            continue
+        for key, results in zip(chunk, chunk_results):
+            serp_cache.set(key, results)
+        _apply_chunk(outcomes, chunk, pending, chunk_results)
+    return outcomes
+
+
+async def async_google_search_batch(queries: list, policy: str = "interactive") -> list:
+    max_age = FRESHNESS_POLICIES[policy]
+    hits = {}
+    if max_age > 0:
+        for q in queries:
+            key = search_cache_key(q["query"], q["country"], q["language"], q["domain"])
+            if key not in hits:
+                hits[key] = await serp_cache.aget(key, max_age=max_age)
+    outcomes, pending = _plan_batch(queries, max_age, lambda key: hits.get(key))
+    semaphore = asyncio.Semaphore(SERPER_BATCH_CONCURRENCY)
+
+    async def run_chunk(chunk: list):
+        async with semaphore:
+            try:
+                chunk_results = await serper_client.asearch_batch(
+                    [pending[key]["payload"] for key in chunk], budget=policy
+                )
+            except Exception as e:
+                logger.error(f"Serper batch chunk failed: {e}")
+                _apply_chunk(outcomes, chunk, pending, error=e)
+                return
+        for key, results in zip(chunk, chunk_results):
+            await serp_cache.aset(key, results)
+        _apply_chunk(outcomes, chunk, pending, chunk_results)
+
+    await asyncio.gather(*(run_chunk(chunk) for chunk in _chunks(list(pending), SERPER_BATCH_SIZE)))
+    return outcomes
 
-    response = requests.post(url, headers=headers, json=payload, timeout=15)
-    response.raise_for_status()
 
-    return response.json()
+def invalidate_search(query: str = None, country: str = None, language: str = None, domain: str = None):
+    if query is None:
+        serp_cache.clear()
+        return
+    # Deep searches cache every page under its own key, so all of them have to go.
+    pages = range(1, math.ceil(SERP_MAX_DEPTH / SERP_PAGE_SIZE) + 1)
+    serp_cache.delete(*(search_cache_key(query, country, language, domain, page) for page in pages))
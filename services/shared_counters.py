@@ -0,0 +1,117 @@
+import os
+import time
+import atexit
+import logging
+import threading
+
+import redis
+
+from services.redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+SHARED_COUNTERS_FLUSH_INTERVAL = float(os.getenv("SHARED_COUNTERS_FLUSH_INTERVAL", "5"))
+
+_mirrors = []
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_mirrors():
+    for counters in list(_mirrors):
+        counters.flush()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(SHARED_COUNTERS_FLUSH_INTERVAL)
+        _flush_mirrors()
+
+
+def _start_flusher():
+    # One daemon thread per process; Celery prefork children start their own after fork.
+    global _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid == os.getpid() or not _mirrors:
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="shared-counters", daemon=True).start()
+
+
+os.register_at_fork(after_in_child=_start_flusher)
+atexit.register(_flush_mirrors)
+
+
+class SharedCounters:
+    # Integer counters summed in one Redis hash by every process (API, bot, Celery workers), so a
+    # metrics endpoint in any of them reports cluster-wide totals. Increments that cannot reach
+    # Redis are kept in the process and added to what that process reports.
+
+    def __init__(self, key: str, fields: tuple):
+        self.key = key
+        self.fields = fields
+        self.local = dict.fromkeys(fields, 0)
+        self.source = None
+        self._flushed = None
+
+    @classmethod
+    def mirror(cls, key: str, source: dict) -> "SharedCounters":
+        # Shares an existing per-process counters dict without touching its hot paths: a background
+        # thread adds what each field gained since the last flush, every SHARED_COUNTERS_FLUSH_INTERVAL
+        # seconds. The snapshot is inherited across fork, so a child never re-adds its parent's counts.
+        counters = cls(key, tuple(source))
+        counters.source = source
+        counters._flushed = dict(source)
+        _mirrors.append(counters)
+        _start_flusher()
+        return counters
+
+    def _deltas(self, current: dict) -> dict:
+        return {field: current[field] - self._flushed.get(field, 0) for field in self.fields}
+
+    def flush(self):
+        current = dict(self.source)
+        deltas = self._deltas(current)
+        self._flushed = current
+        deltas = {field: amount for field, amount in deltas.items() if amount}
+        if deltas:
+            self.incr(**deltas)
+
+    def _failed(self, amounts: dict, e: Exception):
+        logger.warning(f"[counters:{self.key}] Redis unavailable, counting locally: {e}")
+        for field, amount in amounts.items():
+            self.local[field] += amount
+
+    def incr(self, **amounts):
+        try:
+            with get_redis().pipeline(transaction=False) as pipe:
+                for field, amount in amounts.items():
+                    pipe.hincrby(self.key, field, amount)
+                pipe.execute()
+        except redis.RedisError as e:
+            self._failed(amounts, e)
+
+    async def aincr(self, **amounts):
+        try:
+            async with get_async_redis().pipeline(transaction=False) as pipe:
+                for field, amount in amounts.items():
+                    pipe.hincrby(self.key, field, amount)
+                await pipe.execute()
+        except redis.RedisError as e:
+            self._failed(amounts, e)
+
+    async def aread(self) -> dict:
+        values = dict(self.local)
+        if self.source is not None:
+            for field, amount in self._deltas(dict(self.source)).items():
+                values[field] += amount
+        try:
+            stored = await get_async_redis().hgetall(self.key)
+        except redis.RedisError as e:
+            logger.warning(f"[counters:{self.key}] Redis unavailable, reporting local counts: {e}")
+            return values
+        for field, value in stored.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field in values:
+                values[field] += int(value)
+        return values
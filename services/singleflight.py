@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import weakref
+import threading
+
+import redis
+
+from services.redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_LOCK_TTL = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "30"))
+SINGLEFLIGHT_RESULT_TTL = float(os.getenv("SINGLEFLIGHT_RESULT_TTL", "10"))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.05"))
+
+# Deletes the lock only if we still own it.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RemoteFlightError(Exception):
+    pass
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ThreadSingleFlight:
+    # Concurrent threads asking for the same key share one call of fn.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.counters = {"leaders": 0, "followers": 0}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.counters["leaders"] += 1
+            else:
+                self.counters["followers"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class AsyncSingleFlight:
+    # Concurrent coroutines on one event loop asking for the same key share one await of coro_fn().
+
+    def __init__(self):
+        # Keyed weakly by the loop object, so a dead loop's flights go with it and a new loop that
+        # reuses its id() never sees them.
+        self._calls = weakref.WeakKeyDictionary()
+        self.counters = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: str, coro_fn):
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        future = calls.get(key)
+        if future is not None:
+            self.counters["followers"] += 1
+            return await asyncio.shield(future)
+
+        self.counters["leaders"] += 1
+        future = loop.create_future()
+        calls[key] = future
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # mark retrieved so a flight without followers does not log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            calls.pop(key, None)
+
+
+class RedisSingleFlight:
+    # Cross-process coalescing: the first process takes a Redis lock and publishes its result
+    # under a short-lived key, other processes poll for that key instead of calling upstream.
+    # If Redis is unavailable, or the leader dies without publishing, callers run fn themselves.
+
+    def __init__(self, prefix: str, lock_ttl: float = SINGLEFLIGHT_LOCK_TTL,
+                 result_ttl: float = SINGLEFLIGHT_RESULT_TTL, poll_interval: float = SINGLEFLIGHT_POLL_INTERVAL):
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.counters = {"leaders": 0, "followers": 0, "fallbacks": 0}
+
+    def _keys(self, key: str):
+        return f"{self.prefix}:lock:{key}", f"{self.prefix}:result:{key}"
+
+    def _decode(self, raw):
+        payload = json.loads(raw)
+        if payload["ok"]:
+            return payload["v"]
+        raise RemoteFlightError(payload["error"])
+
+    def do(self, key: str, fn):
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+        try:
+            client = get_redis()
+            leader = client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            if leader:
+                client.delete(result_key)
+        except redis.RedisError as e:
+            logger.warning(f"[singleflight:{self.prefix}] Redis unavailable: {e}")
+            self.counters["fallbacks"] += 1
+            return fn()
+
+        if leader:
+            self.counters["leaders"] += 1
+            return self._lead(client, lock_key, result_key, token, fn)
+
+        self.counters["followers"] += 1
+        deadline = time.monotonic() + self.lock_ttl
+        try:
+            while time.monotonic() < deadline:
+                raw = client.get(result_key)
+                if raw is not None:
+                    return self._decode(raw)
+                if not client.exists(lock_key):
+                    raw = client.get(result_key)
+                    if raw is not None:
+                        return self._decode(raw)
+                    break
+                time.sleep(self.poll_interval)
+        except redis.RedisError as e:
+            logger.warning(f"[singleflight:{self.prefix}] Redis unavailable while waiting: {e}")
+        self.counters["fallbacks"] += 1
+        return fn()
+
+    def _lead(self, client, lock_key: str, result_key: str, token: str, fn):
+        payload = None
+        try:
+            result = fn()
+            payload = {"ok": True, "v": result}
+            return result
+        except Exception as e:
+            payload = {"ok": False, "error": str(e)}
+            raise
+        finally:
+            try:
+                if payload is not None:
+                    client.set(result_key, json.dumps(payload), px=int(self.result_ttl * 1000))
+                client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except redis.RedisError as e:
+                logger.warning(f"[singleflight:{self.prefix}] Failed to publish result: {e}")
+
+    async def ado(self, key: str, coro_fn):
+        lock_key, result_key = self._keys(key)
+        token = uuid.uuid4().hex
+        try:
+            client = get_async_redis()
+            leader = await client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            if leader:
+                await client.delete(result_key)
+        except redis.RedisError as e:
+            logger.warning(f"[singleflight:{self.prefix}] Redis unavailable: {e}")
+            self.counters["fallbacks"] += 1
+            return await coro_fn()
+
+        if leader:
+            self.counters["leaders"] += 1
+            return await self._alead(client, lock_key, result_key, token, coro_fn)
+
+        self.counters["followers"] += 1
+        deadline = time.monotonic() + self.lock_ttl
+        try:
+            while time.monotonic() < deadline:
+                raw = await client.get(result_key)
+                if raw is not None:
+                    return self._decode(raw)
+                if not await client.exists(lock_key):
+                    raw = await client.get(result_key)
+                    if raw is not None:
+                        return self._decode(raw)
+                    break
+                await asyncio.sleep(self.poll_interval)
+        except redis.RedisError as e:
+            logger.warning(f"[singleflight:{self.prefix}] Redis unavailable while waiting: {e}")
+        self.counters["fallbacks"] += 1
+        return await coro_fn()
+
+    async def _alead(self, client, lock_key: str, result_key: str, token: str, coro_fn):
+        payload = None
+        try:
+            result = await coro_fn()
+            payload = {"ok": True, "v": result}
+            return result
+        except Exception as e:
+            payload = {"ok": False, "error": str(e)}
+            raise
+        finally:
+            try:
+                if payload is not None:
+                    await client.set(result_key, json.dumps(payload), px=int(self.result_ttl * 1000))
+                await client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except redis.RedisError as e:
+                logger.warning(f"[singleflight:{self.prefix}] Failed to publish result: {e}")
@@ -0,0 +1,42 @@
+import os
+import asyncio
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from services.telegram_sender import TelegramRateMiddleware
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+# Base URL of a self-hosted Bot API server, or of a local fake one in tests, e.g. http://127.0.0.1:8081
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")
+
+# One event loop and one Bot per worker process: the async Redis client and the aiohttp
+# session are bound to the loop that created them, so a fresh loop per task would leak both.
+_loop = None
+_bot = None
+
+
+def create_bot(token: str = None) -> Bot:
+    if TELEGRAM_API_SERVER:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    else:
+        session = AiohttpSession()
+    # Every bot instance, in the bot process and in Celery workers, sends through the shared rate limits.
+    session.middleware(TelegramRateMiddleware())
+    return Bot(token=token or TELEGRAM_BOT_TOKEN, session=session)
+
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def get_worker_bot() -> Bot:
+    global _bot
+    if _bot is None:
+        _bot = create_bot()
+    return _bot
@@ -0,0 +1,202 @@
+import os
+import time
+import uuid
+import logging
+
+import redis
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from services.redis_client import get_async_redis
+from services.rate_limiter import RedisRateLimiter
+from services.shared_counters import SharedCounters
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second per bot, 1 per second in a private chat
+# (short bursts are tolerated) and 20 per minute in a group.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_SEND_MAX_WAIT = float(os.getenv("TELEGRAM_SEND_MAX_WAIT", "60"))
+TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", "3"))
+TELEGRAM_OUTBOX_TTL = int(os.getenv("TELEGRAM_OUTBOX_TTL", "3600"))
+TELEGRAM_OUTBOX_BATCH = int(os.getenv("TELEGRAM_OUTBOX_BATCH", "50"))
+# This many different chats told to wait within the window means the bot-wide limit was hit.
+TELEGRAM_FLOOD_CHATS = int(os.getenv("TELEGRAM_FLOOD_CHATS", "3"))
+TELEGRAM_FLOOD_WINDOW = float(os.getenv("TELEGRAM_FLOOD_WINDOW", "5"))
+TELEGRAM_MESSAGE_LIMIT = 4000
+
+telegram_limiter = RedisRateLimiter("tg:send", {
+    "global": (TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE),
+    "chat": (TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST),
+    "group": (TELEGRAM_GROUP_RATE, 1),
+})
+
+# Sends happen in the bot and the Celery workers, so the counters live in Redis for /metrics/telegram.
+send_counters = SharedCounters(
+    "tg:send:stats", ("requests", "retry_after", "bot_floods", "queued", "coalesced", "sent", "requeued")
+)
+_FLOOD_KEY = "tg:send:flood"
+
+# Releases the outbox drain lock only if we still own it.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _chat_budget(chat_id) -> str:
+    # Group and channel ids are negative; usernames ("@channel") are channels too.
+    try:
+        return "group" if int(chat_id) < 0 else "chat"
+    except ValueError:
+        return "group"
+
+
+async def acquire_send_slot(chat_id, max_wait: float = TELEGRAM_SEND_MAX_WAIT):
+    # Per-chat first, so a slow chat does not hold global tokens it cannot use yet.
+    await telegram_limiter.aacquire(_chat_budget(chat_id), max_wait, key=str(chat_id))
+    await telegram_limiter.aacquire("global", max_wait)
+
+
+async def _is_bot_flood(chat_id) -> bool:
+    # Telegram does not say which limit a 429 is for. One chat being told to wait is that chat's
+    # limit; several different chats within a few seconds point at the bot-wide one.
+    now = time.time()
+    try:
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.zadd(_FLOOD_KEY, {str(chat_id): now})
+            pipe.zremrangebyscore(_FLOOD_KEY, 0, now - TELEGRAM_FLOOD_WINDOW)
+            pipe.zcard(_FLOOD_KEY)
+            pipe.expire(_FLOOD_KEY, int(TELEGRAM_FLOOD_WINDOW) + 1)
+            _, _, chats, _ = await pipe.execute()
+    except redis.RedisError:
+        return False
+    return chats >= TELEGRAM_FLOOD_CHATS
+
+
+class TelegramRateMiddleware(BaseRequestMiddleware):
+    # Every request addressed to a chat waits for a per-chat and a global token, shared through
+    # Redis by the bot and the Celery workers. A 429 pauses only that chat's bucket for exactly
+    # retry_after; all chats pause together only when the bot-wide limit was hit.
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        await send_counters.aincr(requests=1)
+        for attempt in range(TELEGRAM_SEND_RETRIES + 1):
+            await acquire_send_slot(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                await send_counters.aincr(retry_after=1)
+                if attempt == TELEGRAM_SEND_RETRIES:
+                    raise
+                if await _is_bot_flood(chat_id):
+                    await send_counters.aincr(bot_floods=1)
+                    await telegram_limiter.apause(e.retry_after)
+                else:
+                    await telegram_limiter.apause(e.retry_after, _chat_budget(chat_id), str(chat_id))
+
+
+def _outbox_keys(chat_id):
+    return f"tg:outbox:{chat_id}", f"tg:outbox:{chat_id}:lock"
+
+
+def coalesce(texts: list) -> list:
+    # Drops repeats of the same text and packs the rest into as few messages as the size limit allows.
+    merged = []
+    seen = set()
+    for text in texts:
+        if text in seen:
+            continue
+        seen.add(text)
+        if merged and len(merged[-1]) + 2 + len(text) <= TELEGRAM_MESSAGE_LIMIT:
+            merged[-1] += "\n\n" + text
+        else:
+            merged.append(text)
+    return merged
+
+
+async def enqueue_message(chat_id, text: str):
+    outbox_key, _ = _outbox_keys(chat_id)
+    client = get_async_redis()
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.rpush(outbox_key, text)
+        pipe.expire(outbox_key, TELEGRAM_OUTBOX_TTL)
+        await pipe.execute()
+    await send_counters.aincr(queued=1)
+
+
+async def _pop_batch(client, outbox_key: str) -> list:
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.lrange(outbox_key, 0, TELEGRAM_OUTBOX_BATCH - 1)
+        pipe.ltrim(outbox_key, TELEGRAM_OUTBOX_BATCH, -1)
+        texts, _ = await pipe.execute()
+    return [t.decode() if isinstance(t, bytes) else t for t in texts]
+
+
+async def _requeue(client, outbox_key: str, texts: list):
+    if texts:
+        await client.lpush(outbox_key, *reversed(texts))
+        await send_counters.aincr(requeued=len(texts))
+
+
+async def _drain(bot: Bot, client, chat_id, outbox_key: str) -> int:
+    sent = 0
+    while True:
+        texts = await _pop_batch(client, outbox_key)
+        if not texts:
+            return sent
+        messages = coalesce(texts)
+        await send_counters.aincr(coalesced=len(texts) - len(messages))
+        for i, text in enumerate(messages):
+            try:
+                await bot.send_message(chat_id, text)
+            except Exception:
+                await _requeue(client, outbox_key, messages[i:])
+                raise
+            sent += 1
+            await send_counters.aincr(sent=1)
+
+
+async def flush_outbox(bot: Bot, chat_id) -> int:
+    # Only one sender drains a chat's outbox at a time; others just leave their message queued.
+    # Whatever piled up meanwhile (e.g. during a flood wait) is coalesced and sent together.
+    outbox_key, lock_key = _outbox_keys(chat_id)
+    client = get_async_redis()
+    token = uuid.uuid4().hex
+    lock_ms = int((TELEGRAM_SEND_MAX_WAIT + 30) * 1000)
+    sent = 0
+    # Re-check after releasing the lock: a message queued while we were finishing would otherwise wait.
+    while await client.llen(outbox_key):
+        if not await client.set(lock_key, token, nx=True, px=lock_ms):
+            break
+        try:
+            sent += await _drain(bot, client, chat_id, outbox_key)
+        finally:
+            await client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+    return sent
+
+
+async def send_queued(bot: Bot, chat_id, text: str) -> int:
+    # Queues the message in Redis and drains the chat's outbox; without Redis it is sent directly.
+    try:
+        await enqueue_message(chat_id, text)
+    except redis.RedisError as e:
+        logger.warning(f"[telegram] Outbox unavailable, sending directly to {chat_id}: {e}")
+        await bot.send_message(chat_id, text)
+        return 1
+    return await flush_outbox(bot, chat_id)
+
+
+async def send_stats() -> dict:
+    return await send_counters.aread()
@@ -0,0 +1,45 @@
+import os
+import time
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+logger = logging.getLogger(__name__)
+
+STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.0"))
+TELEGRAM_MESSAGE_LIMIT = 4000
+
+
+async def _edit(bot: Bot, chat_id: int, message_id: int, text: str):
+    try:
+        await bot.edit_message_text(text=text, chat_id=chat_id, message_id=message_id)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+
+
+async def render_stream(bot: Bot, chat_id: int, chunks, header: str = "", placeholder: str = "Analyzing...") -> str:
+    # Sends a placeholder and edits it as chunks arrive, at most once per STREAM_EDIT_INTERVAL.
+    # Text that outgrows one message is sent as follow-up messages at the end.
+    message = await bot.send_message(chat_id, placeholder)
+    text = ""
+    last_edit = time.monotonic()
+    async for chunk in chunks:
+        text += chunk
+        now = time.monotonic()
+        if now - last_edit >= STREAM_EDIT_INTERVAL and len(header) + len(text) <= TELEGRAM_MESSAGE_LIMIT:
+            await _edit(bot, chat_id, message.message_id, header + text + " ...")
+            last_edit = now
+
+    text = text.strip()
+    full = header + (text or "Empty analysis.")
+    await _edit(bot, chat_id, message.message_id, full[:TELEGRAM_MESSAGE_LIMIT])
+    for start in range(TELEGRAM_MESSAGE_LIMIT, len(full), TELEGRAM_MESSAGE_LIMIT):
+        await bot.send_message(chat_id, full[start:start + TELEGRAM_MESSAGE_LIMIT])
+    return text
+
+
+async def as_chunks(text: str):
+    # Lets an already complete text go through render_stream.
+    yield text
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.celery_app  # noqa: E402,F401  registers the task modules before anything imports managers.*
+from db.database import Base  # noqa: E402
+import db.models  # noqa: E402,F401
+
+
+@pytest.fixture
+def sqlite_engine():
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from services.rate_limiter import RateLimitTimeout
+from services.serper_service import SerperClient, SerperUnavailable
+
+
+def _half_open(probe_timeout: float = 60) -> CircuitBreaker:
+    # Opens with no reset delay, so the next call becomes the half-open probe.
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0, probe_timeout=probe_timeout)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.counters["opened"] == 1
+    assert breaker.counters["rejected"] == 2
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_one_probe():
+    breaker = _half_open()
+    token = breaker.before_call()
+    assert breaker.state == HALF_OPEN and token is not None
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.release(token)
+    assert breaker.state == CLOSED
+    assert breaker.before_call() is None
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05, probe_timeout=60)
+    breaker.record_failure()
+    time.sleep(0.06)
+    token = breaker.before_call()
+    breaker.record_failure()
+    breaker.release(token)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_released_probe_frees_the_slot():
+    breaker = _half_open()
+    token = breaker.before_call()
+    breaker.release(token)
+    assert breaker.before_call() == token
+
+
+def test_stale_release_does_not_free_a_newer_probe():
+    breaker = _half_open()
+    old = breaker.before_call()
+    breaker.record_failure()
+    new = breaker.before_call()
+    breaker.release(old)
+    assert new != old
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_that_never_reports_back_expires():
+    breaker = _half_open(probe_timeout=0.05)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    assert breaker.before_call() is not None
+    assert breaker.counters["probes_expired"] == 1
+
+
+class _Limiter:
+    def __init__(self, exhausted: bool = False):
+        self.exhausted = exhausted
+
+    def acquire(self, budget: str, max_wait: float):
+        if self.exhausted:
+            raise RateLimitTimeout(budget, 1.0)
+
+    async def aacquire(self, budget: str, max_wait: float):
+        self.acquire(budget, max_wait)
+
+    def backoff(self, retry_after: float = None) -> float:
+        return 0.0
+
+    async def abackoff(self, retry_after: float = None) -> float:
+        return 0.0
+
+    def success(self):
+        pass
+
+    async def asuccess(self):
+        pass
+
+
+def _client(handler, exhausted: bool = False) -> SerperClient:
+    client = SerperClient(api_key="test")
+    client.limiter = _Limiter(exhausted)
+    client.breaker = _half_open()
+    client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    client._client_pid = os.getpid()
+    return client
+
+
+def _assert_probe_free(breaker: CircuitBreaker):
+    assert breaker.before_call() is not None
+    assert breaker.state == HALF_OPEN
+
+
+def test_rate_limited_probe_does_not_leak():
+    client = _client(lambda request: httpx.Response(200, json={}), exhausted=True)
+    with pytest.raises(RateLimitTimeout):
+        client.search("q", "US", "en", "google.com")
+    _assert_probe_free(client.breaker)
+
+
+def test_throttled_probe_does_not_leak():
+    client = _client(lambda request: httpx.Response(429))
+    with pytest.raises(SerperUnavailable):
+        client.search("q", "US", "en", "google.com")
+    _assert_probe_free(client.breaker)
+
+
+def test_successful_probe_closes():
+    client = _client(lambda request: httpx.Response(200, json={"organic": []}))
+    assert client.search("q", "US", "en", "google.com") == {"organic": []}
+    assert client.breaker.state == CLOSED
+
+
+def test_cancelled_probe_does_not_leak():
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run(client: SerperClient):
+        client._async_pid = os.getpid()
+        client._async_clients[asyncio.get_running_loop()] = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        task = asyncio.create_task(client.asearch("q", "US", "en", "google.com"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await client.aclose()
+
+    client = _client(lambda request: httpx.Response(200, json={}))
+    asyncio.run(run(client))
+    _assert_probe_free(client.breaker)
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from db.models import TelegramUser, Project, SearchHistory
+from services.project_service import ServiceError, encode_cursor, decode_cursor, get_history
+
+START = datetime(2026, 10, 18, 12, 0, 0)
+
+
+@pytest.mark.parametrize("created_at, item_id", [
+    (START, 1),
+    (START + timedelta(microseconds=1), 2 ** 31 - 1),
+    (datetime(1970, 1, 1), 7),
+    (datetime(1969, 12, 31, 23, 59, 59, 999999), 3),
+])
+def test_cursor_round_trip(created_at, item_id):
+    cursor = encode_cursor(created_at, item_id)
+    assert decode_cursor(cursor) == (created_at, item_id)
+    assert len(cursor) <= 64
+
+
+@pytest.mark.parametrize("cursor", ["", "abc", "1.2.3", "12", "x.1"])
+def test_bad_cursor_is_a_400(cursor):
+    with pytest.raises(ServiceError) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def _walk(pages: list) -> list:
+    return [item["id"] for page in pages for item in page["items"]]
+
+
+async def _history_pages(limit: int):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session = async_sessionmaker(engine, expire_on_commit=False)
+        async with session() as db:
+            db.add(TelegramUser(chat_id="1"))
+            await db.flush()
+            db.add_all([Project(name="a", creator_id=1), Project(name="b", creator_id=1)])
+            await db.flush()
+            # Pairs of rows share a timestamp, so page boundaries fall between ties decided by id.
+            db.add_all([
+                SearchHistory(project_id=1, user_id=1, query_text=f"q{i}", created_at=START + timedelta(seconds=i // 2))
+                for i in range(7)
+            ])
+            db.add(SearchHistory(project_id=2, user_id=1, query_text="other", created_at=START))
+            await db.commit()
+
+            forward = [await get_history(db, 1, limit=limit)]
+            while forward[-1]["next_cursor"]:
+                forward.append(await get_history(db, 1, limit=limit, cursor=forward[-1]["next_cursor"]))
+            backward = [forward[-1]]
+            while backward[-1]["prev_cursor"]:
+                backward.append(await get_history(db, 1, limit=limit, cursor=backward[-1]["prev_cursor"],
+                                                  direction="prev"))
+            return forward, backward
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 10])
+def test_history_pages_cover_every_row_once(limit):
+    forward, backward = asyncio.run(_history_pages(limit))
+    newest_first = [7, 6, 5, 4, 3, 2, 1]
+    assert _walk(forward) == newest_first
+    assert _walk(reversed(backward)) == newest_first
+    assert all(len(page["items"]) <= limit for page in forward)
+    assert forward[0]["prev_cursor"] is None
+    assert forward[-1]["next_cursor"] is None
@@ -0,0 +1,74 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import repository
+from db.models import TelegramUser, Project, SearchHistory, RankDaily, QueryDaily
+from db.rank_aggregates import rebuild_statements
+
+
+def _serp(*links) -> dict:
+    return {"organic": [{"title": link, "link": link} for link in links]}
+
+
+def _snapshot(db: Session) -> tuple:
+    ranks = db.execute(select(
+        RankDaily.project_id, RankDaily.domain, RankDaily.day, RankDaily.query_text,
+        RankDaily.best_position, RankDaily.position_sum, RankDaily.samples,
+    ).order_by(RankDaily.project_id, RankDaily.domain, RankDaily.query_text)).all()
+    runs = db.execute(select(QueryDaily.project_id, QueryDaily.day, QueryDaily.query_text, QueryDaily.runs)
+                      .order_by(QueryDaily.project_id, QueryDaily.query_text)).all()
+    return ranks, runs
+
+
+def _seed(db: Session):
+    db.add(TelegramUser(chat_id="1"))
+    db.flush()
+    db.add_all([Project(name="a", creator_id=1), Project(name="b", creator_id=1)])
+    db.flush()
+    repository.add_search_history_entries(db, 1, 1, [
+        {"query": "shoes", "results": _serp("https://www.a.com/1", "https://b.com/", "https://a.com/2")},
+        {"query": "boots", "results": _serp("https://b.com/x")},
+        {"query": "empty", "results": {"organic": []}},
+    ])
+    repository.add_search_history_entries(db, 1, 1, [
+        {"query": "shoes", "results_json": '{"organic": [{"link": "https://b.com/y"}, {"link": "https://a.com/3"}]}'},
+    ])
+    repository.add_search_history_entries(db, 2, 1, [{"query": "shoes", "results": _serp("https://a.com/")}])
+    db.commit()
+
+
+def test_ingest_matches_rebuild(sqlite_engine):
+    with Session(sqlite_engine) as db:
+        _seed(db)
+        incremental = _snapshot(db)
+        for stmt in rebuild_statements():
+            db.execute(stmt)
+        db.commit()
+        assert _snapshot(db) == incremental
+
+    ranks, runs = incremental
+    by_key = {(r.project_id, r.domain, r.query_text): r for r in ranks}
+    # www. is folded into the domain and only a search's best position per domain counts.
+    shoes_a = by_key[(1, "a.com", "shoes")]
+    assert (shoes_a.best_position, shoes_a.position_sum, shoes_a.samples) == (1, 3, 2)
+    assert {(r.project_id, r.query_text): r.runs for r in runs} == {
+        (1, "boots"): 1, (1, "empty"): 1, (1, "shoes"): 2, (2, "shoes"): 1,
+    }
+
+
+def test_rebuild_of_one_project_leaves_others(sqlite_engine):
+    with Session(sqlite_engine) as db:
+        _seed(db)
+        before = _snapshot(db)
+        db.execute(RankDaily.__table__.delete().where(RankDaily.project_id == 1))
+        for stmt in rebuild_statements(project_id=1):
+            db.execute(stmt)
+        db.commit()
+        assert _snapshot(db) == before
+
+
+def test_day_is_the_stored_created_at(sqlite_engine):
+    with Session(sqlite_engine) as db:
+        _seed(db)
+        created = {h.created_at.date() for h in db.execute(select(SearchHistory)).scalars()}
+        assert {r.day for r in _snapshot(db)[1]} == created
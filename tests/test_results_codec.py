@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from db import results_codec
+from db.results_codec import encode_results, decode_results, decode_results_text, ResultsDecodeError
+
+RESULTS = {"organic": [{"title": "Ünïcode", "link": "https://example.com/a", "position": 1}], "searchParameters": {"q": "x"}}
+
+
+def _encode(monkeypatch, codec: str) -> dict:
+    monkeypatch.setattr(results_codec, "RESULTS_CODEC", codec)
+    return encode_results(json.dumps(RESULTS))
+
+
+def test_zlib_encode(monkeypatch):
+    columns = _encode(monkeypatch, "zlib")
+    assert columns["results_blob"][:1] == b"z"
+    assert columns["results_jsonb"] is None and columns["results_json"] is None
+    assert decode_results(columns["results_blob"], columns["results_jsonb"], columns["results_json"]) == RESULTS
+
+
+def test_zstd_encode(monkeypatch):
+    pytest.importorskip("zstandard")
+    columns = _encode(monkeypatch, "zstd")
+    assert columns["results_blob"][:1] == b"s"
+    assert decode_results(columns["results_blob"], None, None) == RESULTS
+
+
+def test_jsonb_encode(monkeypatch):
+    columns = _encode(monkeypatch, "jsonb")
+    assert columns["results_blob"] is None
+    assert decode_results(None, columns["results_jsonb"], None) == RESULTS
+    assert json.loads(decode_results_text(None, columns["results_jsonb"], None)) == RESULTS
+
+
+def test_text_encode(monkeypatch):
+    columns = _encode(monkeypatch, "text")
+    assert decode_results(None, None, columns["results_json"]) == RESULTS
+
+
+def test_blob_is_read_from_memoryview(monkeypatch):
+    # psycopg2 hands bytea back as a memoryview.
+    columns = _encode(monkeypatch, "zlib")
+    assert decode_results(memoryview(columns["results_blob"]), None, None) == RESULTS
+
+
+def test_empty_row_decodes_to_empty_dict():
+    assert encode_results(None) == {"results_blob": None, "results_jsonb": None, "results_json": None}
+    assert decode_results(None, None, None) == {}
+
+
+def test_corrupt_blob_raises_value_error():
+    with pytest.raises(ResultsDecodeError):
+        decode_results(b"z" + b"not zlib", None, None)
+    with pytest.raises(ValueError):
+        decode_results(b"z" + b"not zlib", None, None)